@@ -1,11 +1,45 @@
+from typing import Dict
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from app.cache import LRUCache, entity_cache
+from app.config import configure, configure_engine
+from app.metrics import init_metrics
+from app.serialization import serializer
+
+# Bound to the app by create_app, the models and the views only use it
+# inside the app context
+db = SQLAlchemy()
+
+
+def create_app(config: Dict | None = None) -> Flask:
+    """Creates the app with the options from app/config.py, overridden by
+    the FLASK_ environment variables and then by the config"""
+
+    # Imported here, because these modules import db from this one
+    from app.counters import reconcile_counters
+    from app.migrations import upgrade_db
+    from app.views import api
+
+    app = Flask(__name__)
+    configure(app, config)
 
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///API_database.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # The serializer and the cache are shared by all the apps of the process
+    serializer.configure(app.config["JSON_BACKEND"])
+    if app.config["ENTITY_CACHE_SIZE"]:
+        entity_cache.configure(
+            LRUCache(app.config["ENTITY_CACHE_SIZE"], app.config["ENTITY_CACHE_TTL"])
+        )
+    else:
+        entity_cache.configure(None)
 
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(app, db.engine)
+        init_metrics(app, db.engine)
 
-db = SQLAlchemy(app)
+    app.register_blueprint(api)
+    app.cli.add_command(upgrade_db)
+    app.cli.add_command(reconcile_counters)
 
-from app import views
+    return app
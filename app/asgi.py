@@ -0,0 +1,258 @@
+import re
+from typing import Awaitable, Callable, Dict, List, Tuple
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.http import parse_etags
+
+from app import create_app, db
+from app.cache import entity_cache, etag, post_key, reaction_key, user_key
+from app.config import configure_engine
+from app.migrations import upgrade_database
+from app.models import Users, Posts, Reactions, PostReactionCounts, leaderboard_cache
+from app.serialization import (
+    ExpandedUserRow,
+    PostRow,
+    ReactionRow,
+    UserRow,
+    serializer,
+)
+
+# ASGI mode of the API, which is started with
+#     uvicorn app.asgi:asgi_app
+#
+# The requests for the users, the posts and the reactions by id are served
+# on the event loop with async database sessions, so a process isn't limited
+# by its number of threads when there are many slow clients. They produce exactly
+# the same responses as the views and share the entity cache with them.
+# Every other request (and every request these can't answer, like the not found errors)
+# goes to the Flask app, which runs in a thread pool
+
+# Async drivers used when ASYNC_DATABASE_URI isn't set
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+# The path parameters match what the <int:...> converters of the views accept
+ID = "([0-9]+)"
+
+
+class AsyncApp:
+    def __init__(self, flask_app: Flask) -> None:
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+
+        database_uri = flask_app.config["ASYNC_DATABASE_URI"]
+        if database_uri is None:
+            with flask_app.app_context():
+                url = db.engine.url
+            if url.get_backend_name() not in ASYNC_DRIVERS:
+                raise ValueError(
+                    f"ASYNC_DATABASE_URI has to be set for {url.get_backend_name()}"
+                )
+            database_uri = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+        # The same pool size as the sync engine (aiosqlite would open
+        # a new connection for every session without the pool)
+        engine_options = {
+            name: value
+            for name, value in flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"].items()
+            if name in ("pool_size", "max_overflow")
+        }
+        if engine_options:
+            engine_options["poolclass"] = AsyncAdaptedQueuePool
+        self.engine = create_async_engine(database_uri, **engine_options)
+        configure_engine(flask_app, self.engine.sync_engine)
+        self.sessions = async_sessionmaker(self.engine)
+
+        self.routes: List[Tuple[re.Pattern, Callable]] = [
+            (re.compile(f"/users/{ID}"), self.user_json),
+            (re.compile(f"/posts/{ID}"), self.post_json),
+            (re.compile(f"/reactions/{ID}"), self.reaction_json),
+        ]
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            for pattern, load in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match and await load(scope, send, int(match.group(1))):
+                    return
+
+        await self.wsgi_app(scope, receive, send)
+
+    async def lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # The same as run.py does before starting the development server
+                with self.flask_app.app_context():
+                    upgrade_database()
+                    leaderboard_cache.rebuild()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def user_json(self, scope: Dict, send: Callable, user_id: int) -> bool:
+        # Leaving the validation errors (including the empty values) to the view
+        expand = parse_qs(scope["query_string"].decode(), keep_blank_values=True).get(
+            "expand", [None]
+        )[0]
+        if expand is not None and expand != "posts":
+            return False
+        expand_posts = expand == "posts"
+
+        async def serialize(session: AsyncSession) -> bytes | None:
+            user = (
+                await session.execute(
+                    select(
+                        Users.id,
+                        Users.first_name,
+                        Users.last_name,
+                        Users.email,
+                        Users.total_reactions,
+                        Users.post_count,
+                        Users.latest_posts,
+                    ).where(Users.id == user_id)
+                )
+            ).first()
+            if user is None:
+                return None
+            if not expand_posts:
+                return serializer.dumps(UserRow(*user))
+
+            texts = await session.scalars(
+                select(Posts.text).where(Posts.author_id == user_id).order_by(Posts.id)
+            )
+            return serializer.dumps(ExpandedUserRow(*user, list(texts)))
+
+        return await self.json_response(
+            scope, send, user_key(user_id, expand_posts), serialize
+        )
+
+    async def post_json(self, scope: Dict, send: Callable, post_id: int) -> bool:
+        # Leaving the validation errors (including the empty values) to the view
+        reactions_format = parse_qs(
+            scope["query_string"].decode(), keep_blank_values=True
+        ).get("reactions", ["list"])[0]
+        if reactions_format not in ("list", "summary"):
+            return False
+
+        async def serialize(session: AsyncSession) -> bytes | None:
+            post = (
+                await session.execute(
+                    select(Posts.id, Posts.author_id, Posts.text).where(
+                        Posts.id == post_id
+                    )
+                )
+            ).first()
+            if post is None:
+                return None
+
+            # The same ordering as Posts.reactions and Posts.reaction_counts
+            if reactions_format == "summary":
+                reactions = dict(
+                    (
+                        await session.execute(
+                            select(
+                                PostReactionCounts.reaction, PostReactionCounts.count
+                            )
+                            .where(PostReactionCounts.post_id == post_id)
+                            .order_by(
+                                PostReactionCounts.count.desc(),
+                                PostReactionCounts.reaction,
+                            )
+                        )
+                    ).all()
+                )
+            else:
+                reactions = list(
+                    await session.scalars(
+                        select(Reactions.reaction)
+                        .where(Reactions.post_id == post_id)
+                        .order_by(Reactions.id)
+                    )
+                )
+            return serializer.dumps(PostRow(*post, reactions))
+
+        return await self.json_response(
+            scope, send, post_key(post_id, reactions_format), serialize
+        )
+
+    async def reaction_json(
+        self, scope: Dict, send: Callable, reaction_id: int
+    ) -> bool:
+        async def serialize(session: AsyncSession) -> bytes | None:
+            reaction = (
+                await session.execute(
+                    select(
+                        Reactions.id,
+                        Reactions.post_id,
+                        Reactions.author_id,
+                        Reactions.reaction,
+                    ).where(Reactions.id == reaction_id)
+                )
+            ).first()
+            if reaction is None:
+                return None
+            return serializer.dumps(ReactionRow(*reaction))
+
+        return await self.json_response(
+            scope, send, reaction_key(reaction_id), serialize
+        )
+
+    async def json_response(
+        self,
+        scope: Dict,
+        send: Callable,
+        key: str,
+        serialize: Callable[[AsyncSession], Awaitable[bytes | None]],
+    ) -> bool:
+        """Sends the cached json of the key, calling serialize on a miss,
+        the same way EntityCache.json_response does. Returns False without sending
+        anything if the entity doesn't exist"""
+
+        body = entity_cache.get(key)
+        if body is None:
+            generation = entity_cache.generation(key)
+            async with self.sessions() as session:
+                body = await serialize(session)
+            if body is None:
+                return False
+            entity_cache.set(key, body, generation)
+
+        tag = etag(body)
+        headers = [(b"etag", f'"{tag}"'.encode())]
+
+        if_none_match = _header(scope, b"if-none-match")
+        if if_none_match is not None and parse_etags(if_none_match).contains_weak(tag):
+            await send(
+                {"type": "http.response.start", "status": 304, "headers": headers}
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return True
+
+        headers += [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return True
+
+
+def _header(scope: Dict, name: bytes) -> str | None:
+    for header_name, value in scope["headers"]:
+        if header_name == name:
+            return value.decode("latin-1")
+    return None
+
+
+asgi_app = AsyncApp(create_app())
@@ -0,0 +1,189 @@
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Iterable, Protocol, Tuple
+
+from flask import Response, request
+
+
+class CacheBackend(Protocol):
+    """Storage of the serialized entities. Besides the default in-process LRUCache
+    it can be implemented on top of any key-value store with expiring keys (like Redis),
+    which would also share the cache between the worker processes"""
+
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    def delete(self, *keys: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class LRUCache:
+    """In-process cache which keeps at most max_size values
+    for at most ttl seconds (0 means forever)"""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._values: OrderedDict[str, Tuple[bytes, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+
+            value, stored_at = item
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._values[key]
+                return None
+
+            self._values.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._values[key] = (value, time.monotonic())
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+# Number of the generation counters of the keys of the entity cache
+GENERATIONS = 4096
+
+
+class EntityCache:
+    """Read-through cache of the json of the users, the posts and the reactions
+    returned by the GET endpoints, which counts its hits and misses"""
+
+    def __init__(self) -> None:
+        self.backend: CacheBackend | None = None
+        self.hits = 0
+        self.misses = 0
+        # Every invalidation of a key increases its generation, so a json serialized
+        # before the invalidation isn't stored after it. The keys share a fixed number
+        # of counters, the keys with the same counter are only cached less often
+        self._generations = [0] * GENERATIONS
+        self._lock = Lock()
+
+    def configure(self, backend: CacheBackend | None) -> None:
+        """Sets the storage of the cache, None disables the caching"""
+
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> bytes | None:
+        """Returns the cached json of the key (None on a miss)"""
+
+        body = self.backend.get(key) if self.backend is not None else None
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def generation(self, key: str) -> int:
+        """Returns the generation of the key to pass to set
+        (taken before reading the entity from the database)"""
+
+        return self._generations[hash(key) % GENERATIONS]
+
+    def set(self, key: str, body: bytes, generation: int | None = None) -> None:
+        """Stores the json of the key unless the key was invalidated
+        since its generation was taken"""
+
+        if self.backend is None:
+            return
+
+        with self._lock:
+            if generation is None or generation == self.generation(key):
+                self.backend.set(key, body)
+
+    def json_response(
+        self, key: str, serialize: Callable[[], bytes | None]
+    ) -> Response | None:
+        """Returns a json Response with the cached value of the key, calling serialize
+        to get the value on a miss. Returns None if serialize returns None (the entity
+        doesn't exist). Supports the If-None-Match conditional requests"""
+
+        body = self.get(key)
+        if body is None:
+            generation = self.generation(key)
+            body = serialize()
+            if body is None:
+                return None
+            self.set(key, body, generation)
+
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag(body))
+        return response.make_conditional(request)
+
+    def invalidate(
+        self,
+        users: Iterable[int] = (),
+        posts: Iterable[int] = (),
+        reactions: Iterable[int] = (),
+    ) -> None:
+        """Removes the cached json of the entities, which were changed or deleted"""
+
+        if self.backend is None:
+            return
+
+        keys = [
+            user_key(id, expand_posts) for id in users for expand_posts in (False, True)
+        ]
+        for id in posts:
+            keys.extend(
+                post_key(id, reactions_format)
+                for reactions_format in ("list", "summary")
+            )
+        keys.extend(reaction_key(id) for id in reactions)
+
+        if keys:
+            with self._lock:
+                for key in keys:
+                    self._generations[hash(key) % GENERATIONS] += 1
+                self.backend.delete(*keys)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            with self._lock:
+                self._generations = [generation + 1 for generation in self._generations]
+                self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def user_key(user_id: int, expand_posts: bool = False) -> str:
+    return f"user:{user_id}:{'posts' if expand_posts else 'summary'}"
+
+
+def post_key(post_id: int, reactions_format: str) -> str:
+    return f"post:{post_id}:{reactions_format}"
+
+
+def reaction_key(reaction_id: int) -> str:
+    return f"reaction:{reaction_id}"
+
+
+entity_cache = EntityCache()
@@ -0,0 +1,139 @@
+from typing import Dict
+
+from flask import Flask
+from sqlalchemy import Engine, event
+
+
+class Config:
+    # Every option can be overridden with an environment variable prefixed with FLASK_,
+    # for example FLASK_SQLALCHEMY_DATABASE_URI=postgresql://... or FLASK_DB_POOL_SIZE=20
+    # (the values are parsed as json, so numbers and booleans work as expected)
+    SQLALCHEMY_DATABASE_URI = "sqlite:///API_database.db"
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Size of the connection pool of each process and the number of
+    # additional connections which are opened when all the pooled ones are in use
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+
+    # Database used by the async requests of the ASGI mode (app/asgi.py).
+    # By default it's SQLALCHEMY_DATABASE_URI with the async driver
+    # (aiosqlite for SQLite, asyncpg for PostgreSQL)
+    ASYNC_DATABASE_URI = None
+
+    # Pragmas which are set on every new SQLite connection.
+    # WAL lets the readers work while somebody is writing, and with it
+    # synchronous=NORMAL is still safe against corruption (only the last commits
+    # can be lost on a power failure). busy_timeout makes the writers wait
+    # for the lock instead of failing with "database is locked"
+    SQLITE_JOURNAL_MODE = "WAL"
+    SQLITE_SYNCHRONOUS = "NORMAL"
+    SQLITE_BUSY_TIMEOUT = 5000  # milliseconds
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes
+    SQLITE_CACHE_SIZE = -64 * 1024  # negative means kibibytes instead of pages
+
+    # Maximum number of the users, the posts and the reactions json cached by each process
+    # for the GET endpoints (0 disables the cache), and for how many seconds they are kept.
+    # The views invalidate the entries they change, but the changes made by the other
+    # processes are only seen after the TTL
+    ENTITY_CACHE_SIZE = 10000
+    ENTITY_CACHE_TTL = 300
+
+    # Library producing the json of the responses: "orjson", "json" (the standard module)
+    # or "auto", which is orjson if it's installed and json otherwise
+    JSON_BACKEND = "auto"
+
+    # Number of the latest posts of a user included in the json of the user
+    # (the texts of all the posts are only included with expand=posts)
+    USER_LATEST_POSTS = 3
+
+    # Number of the posts on a page of GET /posts/search without the limit parameter
+    SEARCH_PAGE_SIZE = 20
+
+    # Number of the newest posts matching a search query, which are ranked by relevance
+    # (the time of a search grows with it for the words found in many posts)
+    SEARCH_MAX_RANKED = 10000
+
+    # Number of rows fetched from the database at once by the streaming responses
+    STREAM_BATCH_SIZE = 500
+
+    # How often (in seconds) the in-memory leaderboard is reloaded from the database,
+    # which picks up the changes made by other processes (0 means never)
+    LEADERBOARD_TTL = 60
+    # The leaderboard graph shows at most that many users
+    GRAPH_MAX_USERS = 50
+    # Default size (in pixels) and format ("png" or "svg") of the leaderboard graphs,
+    # which the requests can change, and the largest width and height they can ask for
+    GRAPH_WIDTH = 800
+    GRAPH_HEIGHT = 700
+    GRAPH_FORMAT = "png"
+    GRAPH_MAX_SIZE = 2000
+    # Maximum number of the bars of the reaction counts histogram on the distribution graphs
+    GRAPH_DISTRIBUTION_BUCKETS = 20
+    # How many rendered leaderboard graphs are kept in memory
+    GRAPH_CACHE_SIZE = 32
+    # Number of separate processes rendering the graphs (0 renders in the request thread)
+    GRAPH_RENDER_PROCESSES = 0
+    # In the write-behind mode the total_reactions changes caused by reacting
+    # are buffered in memory and written to the database every COUNTERS_FLUSH_INTERVAL seconds
+    # (`flask --app app reconcile-counters` recomputes the counters from the reactions)
+    COUNTERS_WRITE_BEHIND = False
+    COUNTERS_FLUSH_INTERVAL = 1.0
+
+    # Per route latency histograms, SQL statements and response sizes returned by GET /metrics.
+    # METRICS_SERVER_TIMING also adds them to every response as the Server-Timing header,
+    # and the statements slower than SLOW_QUERY_MS milliseconds are logged (None disables it)
+    METRICS_ENABLED = True
+    METRICS_SERVER_TIMING = False
+    SLOW_QUERY_MS = 100
+
+    # Production server started by serve.py: the address it listens on, the number
+    # of the worker processes (None is the number of the CPU cores) and of the threads
+    # in each of them. With SERVER_PRELOAD the app is created once before forking the workers
+    SERVER_BIND = "127.0.0.1:8000"
+    SERVER_WORKERS = None
+    SERVER_THREADS = 4
+    SERVER_PRELOAD = True
+
+
+def configure(app: Flask, overrides: Dict | None = None) -> None:
+    """Loads the Config, the environment variables and the overrides
+    into the app config and derives the engine options from them"""
+
+    app.config.from_object(Config)
+    app.config.from_prefixed_env()
+    if overrides:
+        app.config.update(overrides)
+
+    engine_options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+
+    # In-memory SQLite databases use a pool with one connection per thread,
+    # which doesn't support the overflow
+    database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not (database_uri.startswith("sqlite") and ":memory:" in database_uri):
+        engine_options.setdefault("pool_size", app.config["DB_POOL_SIZE"])
+        engine_options.setdefault("max_overflow", app.config["DB_MAX_OVERFLOW"])
+
+
+def configure_engine(app: Flask, engine: Engine) -> None:
+    """Sets the SQLite pragmas from the app config on every new connection of the engine"""
+
+    pragmas = {
+        "journal_mode": app.config["SQLITE_JOURNAL_MODE"],
+        "synchronous": app.config["SQLITE_SYNCHRONOUS"],
+        "busy_timeout": app.config["SQLITE_BUSY_TIMEOUT"],
+        "mmap_size": app.config["SQLITE_MMAP_SIZE"],
+        "cache_size": app.config["SQLITE_CACHE_SIZE"],
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        # The pragmas don't make sense for the other databases
+        if engine.dialect.name != "sqlite":
+            return
+
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
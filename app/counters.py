@@ -0,0 +1,296 @@
+import atexit
+from collections import Counter
+from threading import Event, Lock, Thread
+from typing import Dict, Iterable, Tuple
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.cache import entity_cache
+from app.models import (
+    Users,
+    Posts,
+    Reactions,
+    PostReactionCounts,
+    existing_ids,
+    leaderboard_cache,
+)
+
+# All the changes of total_reactions and of the post_reaction_counts go through this module.
+# They are done with UPDATE ... SET total_reactions = total_reactions + :delta statements
+# instead of changing the loaded objects,
+# so concurrent requests can't overwrite each other's changes
+
+
+def reaction_counts(group_by, *conditions) -> Dict:
+    """Returns the number of reactions matching the conditions for each value
+    of the group_by column (Reactions.author_id or Reactions.post_id)
+    or for each combination of values of a tuple of columns"""
+
+    columns = group_by if isinstance(group_by, tuple) else (group_by,)
+    query = (
+        db.session.query(*columns, db.func.count(Reactions.id))
+        .filter(*conditions)
+        .group_by(*columns)
+    )
+
+    if isinstance(group_by, tuple):
+        return {tuple(row[:-1]): row[-1] for row in query}
+    return {id: count for id, count in query}
+
+
+def change_total_reactions(
+    model: type[Users] | type[Posts], deltas: Dict[int, int]
+) -> None:
+    """Adds the deltas to total_reactions of the rows with the corresponding ids
+    with a single executemany UPDATE"""
+
+    if not deltas:
+        return
+
+    table = model.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(total_reactions=table.c.total_reactions + bindparam("delta")),
+        [{"row_id": id, "delta": delta} for id, delta in deltas.items()],
+    )
+
+
+def change_post_reaction_counts(deltas: Dict[Tuple[int, str], int]) -> None:
+    """Adds the deltas to the counts of the (post_id, reaction) pairs
+    with a single executemany upsert and removes the counts which reached 0"""
+
+    if not deltas:
+        return
+
+    # Upserts are specific to the database, the syntax is the same
+    # for the SQLite and the PostgreSQL though
+    if db.engine.dialect.name == "postgresql":
+        statement = postgresql.insert(PostReactionCounts)
+    else:
+        statement = sqlite.insert(PostReactionCounts)
+    statement = statement.on_conflict_do_update(
+        index_elements=[PostReactionCounts.post_id, PostReactionCounts.reaction],
+        set_={"count": PostReactionCounts.count + statement.excluded.count},
+    )
+
+    db.session.execute(
+        statement,
+        [
+            {"post_id": post_id, "reaction": reaction, "count": delta}
+            for (post_id, reaction), delta in deltas.items()
+        ],
+    )
+
+    if any(delta < 0 for delta in deltas.values()):
+        db.session.execute(
+            delete(PostReactionCounts)
+            .where(
+                PostReactionCounts.post_id.in_({post_id for post_id, _ in deltas}),
+                PostReactionCounts.count <= 0,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+class CounterBuffer:
+    """Accumulates the total_reactions deltas in memory,
+    which a background thread periodically writes to the database
+    with one UPDATE per table (see the COUNTERS_WRITE_BEHIND config option)"""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        # Makes an explicit flush wait for the one the background thread is doing
+        self._flush_lock = Lock()
+        self._users_deltas: Counter = Counter()
+        self._posts_deltas: Counter = Counter()
+        self._reactions_deltas: Counter = Counter()
+
+        self._app: Flask | None = None
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def add(
+        self,
+        users_deltas: Dict[int, int],
+        posts_deltas: Dict[int, int],
+        reactions_deltas: Dict[Tuple[int, str], int],
+    ) -> None:
+        with self._lock:
+            self._users_deltas.update(users_deltas)
+            self._posts_deltas.update(posts_deltas)
+            self._reactions_deltas.update(reactions_deltas)
+
+            if self._thread is None:
+                self._start(current_app._get_current_object())
+
+    def discard(self, users: Iterable[int] = (), posts: Iterable[int] = ()) -> None:
+        """Drops the deltas of the deleted users and posts, which would otherwise
+        be written to the new rows reusing their ids (SQLite reuses the biggest id)"""
+
+        users, posts = set(users), set(posts)
+        with self._lock:
+            for id in users:
+                self._users_deltas.pop(id, None)
+            for id in posts:
+                self._posts_deltas.pop(id, None)
+            for key in [key for key in self._reactions_deltas if key[0] in posts]:
+                del self._reactions_deltas[key]
+
+    def _start(self, flask_app: Flask) -> None:
+        self._app = flask_app
+        self._thread = Thread(target=self._run, name="counters-flusher", daemon=True)
+        self._thread.start()
+
+        # Writing the rest of the deltas when the process exits
+        atexit.register(self.stop)
+
+    def _run(self) -> None:
+        interval = self._app.config["COUNTERS_FLUSH_INTERVAL"]
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                self._app.logger.exception("Failed to flush the reaction counters")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def flush(self) -> None:
+        """Writes all the accumulated deltas to the database"""
+
+        # Nothing was buffered in this process yet
+        if self._app is None:
+            return
+
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            users_deltas, self._users_deltas = self._users_deltas, Counter()
+            posts_deltas, self._posts_deltas = self._posts_deltas, Counter()
+            reactions_deltas, self._reactions_deltas = self._reactions_deltas, Counter()
+
+        users_deltas = {key: delta for key, delta in users_deltas.items() if delta}
+        posts_deltas = {key: delta for key, delta in posts_deltas.items() if delta}
+        reactions_deltas = {
+            key: delta for key, delta in reactions_deltas.items() if delta
+        }
+        if not users_deltas and not posts_deltas and not reactions_deltas:
+            return
+
+        with self._app.app_context():
+            try:
+                # The posts might have been deleted since the deltas were recorded,
+                # their counts mustn't be inserted again (the UPDATEs of the deleted
+                # users and posts just don't change anything)
+                posts_ids = existing_ids(
+                    Posts, {post_id for post_id, _ in reactions_deltas}
+                )
+                change_total_reactions(Users, users_deltas)
+                change_total_reactions(Posts, posts_deltas)
+                change_post_reaction_counts(
+                    {
+                        key: delta
+                        for key, delta in reactions_deltas.items()
+                        if key[0] in posts_ids
+                    }
+                )
+                db.session.commit()
+            except Exception:
+                # Putting the deltas back to retry them with the next flush
+                db.session.rollback()
+                with self._lock:
+                    self._users_deltas.update(users_deltas)
+                    self._posts_deltas.update(posts_deltas)
+                    self._reactions_deltas.update(reactions_deltas)
+                raise
+
+        # The cached json contains total_reactions of the users
+        # and the reactions summaries of the posts
+        entity_cache.invalidate(
+            users=users_deltas, posts={post_id for post_id, _ in reactions_deltas}
+        )
+
+
+counter_buffer = CounterBuffer()
+
+
+def record_reactions(
+    users_deltas: Dict[int, int],
+    posts_deltas: Dict[int, int],
+    reactions_deltas: Dict[Tuple[int, str], int],
+) -> None:
+    """Changes total_reactions of the users and the posts and the counts
+    of the (post_id, reaction) pairs by the deltas, either as a part of
+    the current transaction or, in the write-behind mode, later by the background thread
+    """
+
+    if current_app.config["COUNTERS_WRITE_BEHIND"]:
+        counter_buffer.add(users_deltas, posts_deltas, reactions_deltas)
+    else:
+        change_total_reactions(Users, users_deltas)
+        change_total_reactions(Posts, posts_deltas)
+        change_post_reaction_counts(reactions_deltas)
+
+
+def discard_reactions(users: Iterable[int] = (), posts: Iterable[int] = ()) -> None:
+    """Forgets the buffered changes of the deleted users and posts
+    (nothing is buffered unless the write-behind mode is on)"""
+
+    if current_app.config["COUNTERS_WRITE_BEHIND"]:
+        counter_buffer.discard(users, posts)
+
+
+def rebuild_post_reaction_counts() -> None:
+    """Recomputes the post_reaction_counts table from the reactions table"""
+
+    db.session.execute(
+        delete(PostReactionCounts).execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        insert(PostReactionCounts).from_select(
+            ["post_id", "reaction", "count"],
+            select(Reactions.post_id, Reactions.reaction, func.count(Reactions.id))
+            .where(Reactions.post_id.is_not(None))
+            .group_by(Reactions.post_id, Reactions.reaction),
+        )
+    )
+
+
+@click.command("reconcile-counters")
+@with_appcontext
+def reconcile_counters() -> None:
+    """Recomputes total_reactions of all the users and the posts
+    and the post_reaction_counts from the reactions table"""
+
+    counter_buffer.flush()
+
+    for model, column in (
+        (Users, Reactions.author_id),
+        (Posts, Reactions.post_id),
+    ):
+        db.session.execute(
+            update(model)
+            .values(
+                total_reactions=select(func.count(Reactions.id))
+                .where(column == model.id)
+                .scalar_subquery()
+            )
+            .execution_options(synchronize_session=False)
+        )
+    rebuild_post_reaction_counts()
+    db.session.commit()
+
+    leaderboard_cache.invalidate()
+    entity_cache.clear()
+    click.echo("The reaction counters are reconciled")
@@ -0,0 +1,45 @@
+import sys
+import unicodedata
+from types import MappingProxyType
+from typing import Mapping
+
+from emoji import EMOJI_DATA
+from emoji.unicode_codes import get_emoji_unicode_dict
+
+# Both tables are built once on import, so normalizing a reaction is a dict lookup
+# instead of running emoji.emojize and emoji.is_emoji on every request.
+# The strings are interned, so all the stored reactions with the same emoji
+# share one string object
+
+# Every single emoji mapped to itself
+_EMOJIS: Mapping[str, str] = MappingProxyType(
+    {emoji: sys.intern(emoji) for emoji in EMOJI_DATA}
+)
+
+# ":unicode_emoji_CLDR_short_name:" mapped to the emoji, the same names emoji.emojize uses
+_SHORTCODES: Mapping[str, str] = MappingProxyType(
+    {
+        name: _EMOJIS[emoji]
+        for name, emoji in get_emoji_unicode_dict("en").items()
+        if emoji in _EMOJIS
+    }
+)
+
+
+def normalize_reaction(reaction: str) -> str | None:
+    """Returns the emoji for a single emoji or an emoji short name in the
+    :unicode_emoji_CLDR_short_name: format, otherwise returns None.
+    Gives the same results as emoji.is_emoji(emoji.emojize(reaction))"""
+
+    emoji = _EMOJIS.get(reaction)
+    if emoji is not None:
+        return emoji
+
+    if not (len(reaction) > 2 and reaction[0] == reaction[-1] == ":"):
+        return None
+
+    emoji = _SHORTCODES.get(reaction)
+    if emoji is None and not reaction.isascii():
+        # emoji.emojize normalizes the names the same way
+        emoji = _SHORTCODES.get(unicodedata.normalize("NFKC", reaction))
+    return emoji
@@ -0,0 +1,129 @@
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Dict, Hashable, List, NamedTuple
+
+from app.metrics import metrics
+
+# Percentiles of total_reactions shown on the distribution graphs
+PERCENTILES = [50, 90, 99]
+
+
+class GraphOptions(NamedTuple):
+    graph_type: str  # "top" or "distribution"
+    image_format: str  # "png" or "svg"
+    width: int  # pixels
+    height: int
+
+
+class Distribution(NamedTuple):
+    # counts[i] users have from edges[i] to edges[i + 1] - 1 reactions
+    edges: List[int]
+    counts: List[int]
+    percentiles: Dict[int, float]
+
+
+def reaction_distribution(totals: List[int], buckets: int) -> Distribution:
+    """Returns the histogram and the percentiles of total_reactions of all the users,
+    so the graph has the same number of bars however many users there are"""
+
+    # Only the processes drawing the distributions import numpy (like matplotlib)
+    import numpy as np
+
+    if not totals:
+        return Distribution([0, 1], [0], {p: 0.0 for p in PERCENTILES})
+
+    values = np.array(totals, dtype=np.int64)
+    maximum = int(values.max())
+
+    # The buckets grow exponentially, because most of the users have a few reactions,
+    # while a few of them have thousands. Zero reactions get a bucket of their own
+    edges = np.unique(
+        np.concatenate(
+            (
+                [0, maximum + 1],
+                np.geomspace(1, maximum + 1, buckets).round().astype(np.int64),
+            )
+        )
+    )
+    counts, _ = np.histogram(values, edges)
+
+    return Distribution(
+        edges.tolist(),
+        counts.tolist(),
+        dict(zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist())),
+    )
+
+
+class GraphCache:
+    """Least recently used cache of the rendered graphs"""
+
+    def __init__(self) -> None:
+        self._graphs: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> bytes | None:
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+            return graph
+
+    def put(self, key: Hashable, graph: bytes, max_size: int) -> None:
+        with self._lock:
+            self._graphs[key] = graph
+            self._graphs.move_to_end(key)
+            while len(self._graphs) > max_size:
+                self._graphs.popitem(last=False)
+
+
+graph_cache = GraphCache()
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def render_in_worker(
+    processes: int,
+    labels: List[str],
+    reaction_counts: List[int],
+    options: GraphOptions,
+    distribution: Distribution | None = None,
+) -> bytes:
+    """Renders the graph in a separate process if processes > 0,
+    so the rendering doesn't hold the GIL of the process serving the requests"""
+
+    global _executor
+
+    start = time.perf_counter()
+    if processes <= 0:
+        graph = _render(labels, reaction_counts, options, distribution)
+    else:
+        with _executor_lock:
+            if _executor is None:
+                # Spawning instead of forking the (possibly multithreaded) server process
+                _executor = ProcessPoolExecutor(
+                    max_workers=processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        graph = _executor.submit(
+            _render, labels, reaction_counts, options, distribution
+        ).result()
+
+    metrics.record_render((time.perf_counter() - start) * 1000)
+    return graph
+
+
+def _render(
+    labels: List[str],
+    reaction_counts: List[int],
+    options: GraphOptions,
+    distribution: Distribution | None,
+) -> bytes:
+    # matplotlib (with numpy) is only imported by the first rendering in the process,
+    # so the processes which never render a graph don't spend the time and the memory on it
+    from app.rendering import render_leaderboard_graph
+
+    return render_leaderboard_graph(labels, reaction_counts, options, distribution)
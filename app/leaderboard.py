@@ -0,0 +1,131 @@
+import time
+from bisect import bisect_left, bisect_right, insort
+from threading import RLock
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from flask import current_app
+
+
+class Leaderboard:
+    """In-process copy of the users ordering by (total_reactions, id).
+
+    The views keep it up to date after every commit that changes
+    total_reactions, and it's additionally rebuilt from the database
+    after LEADERBOARD_TTL seconds, to pick up changes made by other processes."""
+
+    def __init__(self, load: Callable[[], Iterable[Tuple[int, int]]]) -> None:
+        # load returns (total_reactions, id) pairs of all the users
+        self._load = load
+        self._lock = RLock()
+
+        # Sorted list of (total_reactions, id) keys
+        # and the current key of each user for finding it in the list
+        self._keys: List[Tuple[int, int]] = []
+        self._key_by_id: Dict[int, Tuple[int, int]] = {}
+        self._built_at: float | None = None
+
+        # Changes every time the ordering might have changed,
+        # so it can be used as a part of the key for caching things derived from it
+        self.version = 0
+
+    def rebuild(self) -> None:
+        """Reloads the whole leaderboard from the database"""
+
+        keys = sorted(
+            (total_reactions or 0, id) for total_reactions, id in self._load()
+        )
+        with self._lock:
+            self._keys = keys
+            self._key_by_id = {key[1]: key for key in keys}
+            self._built_at = time.monotonic()
+            self.version += 1
+
+    def invalidate(self) -> None:
+        """Forces a rebuild on the next read"""
+
+        with self._lock:
+            self._built_at = None
+            self.version += 1
+
+    def _ensure_fresh(self) -> None:
+        ttl = current_app.config.get("LEADERBOARD_TTL")
+        with self._lock:
+            if self._built_at is not None and (
+                not ttl or time.monotonic() - self._built_at < ttl
+            ):
+                return
+        self.rebuild()
+
+    def add_user(self, user_id: int, total_reactions: int = 0) -> None:
+        with self._lock:
+            if self._built_at is None or user_id in self._key_by_id:
+                return
+            key = (total_reactions, user_id)
+            insort(self._keys, key)
+            self._key_by_id[user_id] = key
+            self.version += 1
+
+    def remove_user(self, user_id: int) -> None:
+        with self._lock:
+            key = self._key_by_id.pop(user_id, None)
+            if key is not None:
+                del self._keys[bisect_left(self._keys, key)]
+                self.version += 1
+
+    def apply_deltas(self, deltas: Dict[int, int]) -> None:
+        """Changes total_reactions of the users by the given amounts"""
+
+        with self._lock:
+            # Nothing to update, the next read will load everything anyway
+            if self._built_at is None:
+                return
+
+            for user_id, delta in deltas.items():
+                key = self._key_by_id.get(user_id)
+                if key is None or delta == 0:
+                    continue
+                del self._keys[bisect_left(self._keys, key)]
+                key = (key[0] + delta, user_id)
+                insort(self._keys, key)
+                self._key_by_id[user_id] = key
+                self.version += 1
+
+    def totals(self) -> List[int]:
+        """Returns total_reactions of all the users in the ascending order"""
+
+        self._ensure_fresh()
+
+        with self._lock:
+            return [key[0] for key in self._keys]
+
+    def page(
+        self, sort_type: str, limit: int, cursor: str | None = None
+    ) -> Tuple[List[int], str | None]:
+        """Returns the ids of the users on the page and the cursor of the next page
+        (None if it's the last page). The cursors are compatible with models.paginate"""
+
+        self._ensure_fresh()
+
+        with self._lock:
+            if sort_type == "asc":
+                start = 0
+                if cursor is not None:
+                    start = bisect_right(self._keys, _parse_cursor(cursor))
+                keys = self._keys[start : start + limit]
+                has_next = start + limit < len(self._keys)
+            else:
+                end = len(self._keys)
+                if cursor is not None:
+                    end = bisect_left(self._keys, _parse_cursor(cursor))
+                keys = self._keys[max(end - limit, 0) : end][::-1]
+                has_next = end - limit > 0
+
+        next_cursor = None
+        if has_next and keys:
+            next_cursor = f"{keys[-1][0]}:{keys[-1][1]}"
+        return [key[1] for key in keys], next_cursor
+
+
+def _parse_cursor(cursor: str) -> Tuple[int, int]:
+    total_reactions, last_id = map(int, cursor.split(":"))
+    return total_reactions, last_id
@@ -0,0 +1,339 @@
+import bisect
+import logging
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List
+
+from flask import Flask, Response, g, has_request_context, request
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in milliseconds) of the buckets of the latency histograms,
+# the last bucket counts everything slower
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class Histogram:
+    """Numbers of the observed durations in each of the BUCKETS_MS buckets,
+    with their count, sum and maximum"""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+        self.max = max(self.max, ms)
+
+    def to_dict(self) -> Dict:
+        bounds = [str(bound) for bound in BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "max_ms": round(self.max, 3),
+            "buckets_ms": dict(zip(bounds, self.buckets)),
+        }
+
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(**labels: str) -> str:
+    # The backslashes, the quotes and the line breaks have to be escaped in the values
+    return ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+
+
+def _histogram_samples(name: str, histogram: Histogram, labels: str = "") -> List[str]:
+    """Returns the samples of the histogram: the cumulative numbers of the durations
+    up to each bucket bound (le, in seconds), their sum and count"""
+
+    samples = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS_MS + [None], histogram.buckets):
+        cumulative += count
+        le = _labels(le="+Inf" if bound is None else f"{bound / 1000:g}")
+        bucket_labels = f"{labels},{le}" if labels else le
+        samples.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+    braces = f"{{{labels}}}" if labels else ""
+    samples.append(f"{name}_sum{braces} {histogram.sum / 1000:.6f}")
+    samples.append(f"{name}_count{braces} {histogram.count}")
+    return samples
+
+
+@dataclass
+class RouteMetrics:
+    latency: Histogram = field(default_factory=Histogram)
+    statuses: Dict[int, int] = field(default_factory=dict)
+    sql_statements: int = 0
+    sql_ms: float = 0.0
+    response_bytes: int = 0
+    max_response_bytes: int = 0
+
+    def to_dict(self) -> Dict:
+        requests = self.latency.count
+        return {
+            "requests": requests,
+            "statuses": {str(status): n for status, n in self.statuses.items()},
+            "latency": self.latency.to_dict(),
+            "sql_statements": self.sql_statements,
+            "sql_statements_per_request": round(self.sql_statements / requests, 2),
+            "sql_ms": round(self.sql_ms, 3),
+            "response_bytes": self.response_bytes,
+            "mean_response_bytes": round(self.response_bytes / requests),
+            "max_response_bytes": self.max_response_bytes,
+        }
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    # Collected in g during a request and recorded when its response is ready
+    start: float
+    sql_statements: int = 0
+    sql_ms: float = 0.0
+    render_ms: float = 0.0
+
+
+class Metrics:
+    """Per route latency histograms, SQL statements and response sizes
+    and the graph rendering times of the process"""
+
+    def __init__(self) -> None:
+        self.routes: Dict[str, RouteMetrics] = {}
+        self.render = Histogram()
+        self.slow_queries = 0
+        self._lock = Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.routes = {}
+            self.render = Histogram()
+            self.slow_queries = 0
+
+    def record_request(
+        self, route: str, timings: RequestTimings, response: Response
+    ) -> float:
+        """Adds the finished request to the metrics of the route
+        and returns its duration in milliseconds"""
+
+        ms = (time.perf_counter() - timings.start) * 1000
+        # Streamed responses don't know their size until they are sent
+        size = response.content_length or 0
+
+        with self._lock:
+            metrics = self.routes.get(route)
+            if metrics is None:
+                metrics = self.routes[route] = RouteMetrics()
+            metrics.latency.observe(ms)
+            metrics.statuses[response.status_code] = (
+                metrics.statuses.get(response.status_code, 0) + 1
+            )
+            metrics.sql_statements += timings.sql_statements
+            metrics.sql_ms += timings.sql_ms
+            metrics.response_bytes += size
+            metrics.max_response_bytes = max(metrics.max_response_bytes, size)
+        return ms
+
+    def record_query(
+        self, ms: float, statement: str, slow_query_ms: float | None
+    ) -> None:
+        if has_request_context() and "timings" in g:
+            g.timings.sql_statements += 1
+            g.timings.sql_ms += ms
+
+        if slow_query_ms is not None and ms >= slow_query_ms:
+            with self._lock:
+                self.slow_queries += 1
+            logger.warning("Slow query (%.1fms): %s", ms, statement)
+
+    def record_render(self, ms: float) -> None:
+        if has_request_context() and "timings" in g:
+            g.timings.render_ms += ms
+        with self._lock:
+            self.render.observe(ms)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "routes": {
+                    route: metrics.to_dict()
+                    for route, metrics in sorted(self.routes.items())
+                },
+                "render": self.render.to_dict(),
+                "slow_queries": self.slow_queries,
+            }
+
+    def to_prometheus(self, cache_stats: Dict[str, int]) -> str:
+        """Returns the metrics and the entity cache hits and misses
+        in the Prometheus text exposition format"""
+
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help: str, samples: List[str]) -> None:
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", *samples])
+
+        with self._lock:
+            routes = [
+                (_labels(route=route), metrics)
+                for route, metrics in sorted(self.routes.items())
+            ]
+
+            family(
+                "api_request_duration_seconds",
+                "histogram",
+                "Time to produce the responses of the route",
+                [
+                    sample
+                    for labels, metrics in routes
+                    for sample in _histogram_samples(
+                        "api_request_duration_seconds", metrics.latency, labels
+                    )
+                ],
+            )
+            family(
+                "api_requests_total",
+                "counter",
+                "Responses of the route by status",
+                [
+                    f"api_requests_total{{{labels},{_labels(status=str(status))}}} {n}"
+                    for labels, metrics in routes
+                    for status, n in sorted(metrics.statuses.items())
+                ],
+            )
+            family(
+                "api_sql_statements_total",
+                "counter",
+                "SQL statements executed by the requests of the route",
+                [
+                    f"api_sql_statements_total{{{labels}}} {metrics.sql_statements}"
+                    for labels, metrics in routes
+                ],
+            )
+            family(
+                "api_sql_duration_seconds_total",
+                "counter",
+                "Time spent in the SQL statements of the requests of the route",
+                [
+                    f"api_sql_duration_seconds_total{{{labels}}} "
+                    f"{metrics.sql_ms / 1000:.6f}"
+                    for labels, metrics in routes
+                ],
+            )
+            family(
+                "api_response_bytes_total",
+                "counter",
+                "Size of the responses of the route (the streamed ones count as 0)",
+                [
+                    f"api_response_bytes_total{{{labels}}} {metrics.response_bytes}"
+                    for labels, metrics in routes
+                ],
+            )
+            family(
+                "api_response_bytes_max",
+                "gauge",
+                "Size of the largest response of the route",
+                [
+                    f"api_response_bytes_max{{{labels}}} {metrics.max_response_bytes}"
+                    for labels, metrics in routes
+                ],
+            )
+            family(
+                "api_graph_render_duration_seconds",
+                "histogram",
+                "Time to render the leaderboard graphs",
+                _histogram_samples("api_graph_render_duration_seconds", self.render),
+            )
+            family(
+                "api_slow_queries_total",
+                "counter",
+                "SQL statements slower than SLOW_QUERY_MS",
+                [f"api_slow_queries_total {self.slow_queries}"],
+            )
+
+        family(
+            "api_entity_cache_hits_total",
+            "counter",
+            "Requests served from the entity cache",
+            [f"api_entity_cache_hits_total {cache_stats['hits']}"],
+        )
+        family(
+            "api_entity_cache_misses_total",
+            "counter",
+            "Requests for the entities missing from the entity cache",
+            [f"api_entity_cache_misses_total {cache_stats['misses']}"],
+        )
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def server_timing(timings: RequestTimings, total_ms: float) -> str:
+    """Value of the Server-Timing header, which the browser developer tools show"""
+
+    parts: List[str] = [
+        f'db;dur={timings.sql_ms:.1f};desc="{timings.sql_statements} queries"'
+    ]
+    if timings.render_ms:
+        parts.append(f"render;dur={timings.render_ms:.1f}")
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def init_metrics(app: Flask, engine: Engine) -> None:
+    """Records the requests of the app and the statements executed by the engine"""
+
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    slow_query_ms = app.config["SLOW_QUERY_MS"]
+
+    @app.before_request
+    def start_timings() -> None:
+        g.timings = RequestTimings(time.perf_counter())
+
+    @app.after_request
+    def record_timings(response: Response) -> Response:
+        # Another before_request function has failed before this one has run
+        if "timings" not in g:
+            return response
+
+        # The requests which didn't match any route are counted together
+        route = (
+            f"{request.method} {request.url_rule.rule}"
+            if request.url_rule is not None
+            else "unmatched"
+        )
+        total_ms = metrics.record_request(route, g.timings, response)
+        if app.config["METRICS_SERVER_TIMING"]:
+            response.headers["Server-Timing"] = server_timing(g.timings, total_ms)
+        return response
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany) -> None:
+        ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        metrics.record_query(ms, statement, slow_query_ms)
+
+    @event.listens_for(engine, "handle_error")
+    def drop_failed_query(context) -> None:
+        # after_cursor_execute isn't called for the failed statements
+        if context.connection is not None and context.connection.info.get(
+            "query_start"
+        ):
+            context.connection.info["query_start"].pop()
@@ -0,0 +1,74 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from app import db
+from app.counters import rebuild_post_reaction_counts
+from app.models import Users, PostReactionCounts
+from app.post_summaries import refresh_post_summaries
+from app.search import create_search_index, search_index_supported
+
+
+def upgrade_database() -> None:
+    """Creates the missing tables and adds the columns and the indexes added
+    to the existing tables (db.create_all only creates the columns and the indexes
+    together with their tables), then the full-text search index of the posts"""
+
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    db.create_all()
+
+    # Adding the new columns to the tables, which existed before
+    added_columns = set()
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name not in existing_columns:
+                definition = CreateColumn(column).compile(dialect=db.engine.dialect)
+                db.session.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+                )
+                added_columns.add((table.name, column.name))
+    db.session.commit()
+
+    # Filling the summaries of the posts of the users, which didn't exist
+    # in the older versions
+    users_table = Users.__tablename__
+    if {(users_table, "post_count"), (users_table, "latest_posts")} & added_columns:
+        refresh_post_summaries()
+        db.session.commit()
+
+    # Filling the aggregate tables, which didn't exist in the older versions,
+    # from the data which is already in the database
+    if PostReactionCounts.__tablename__ not in existing_tables:
+        rebuild_post_reaction_counts()
+        db.session.commit()
+
+    # The full-text index of the posts (only on SQLite) is filled
+    # from the existing posts when it's created
+    if search_index_supported():
+        create_search_index()
+
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
+
+
+@click.command("upgrade-db")
+@with_appcontext
+def upgrade_db() -> None:
+    """Brings the schema of an existing database up to date"""
+
+    upgrade_database()
+    click.echo("The database is up to date")
@@ -1,17 +1,25 @@
 import re
-import emoji
-import json
-import os
-import matplotlib
-
-# Fixes the RuntimeError: "main thread is not in main loop",
-# which occures during the proccess of saving the graph with plt.savefig()
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import numpy as np
+import io
+from collections import defaultdict, deque
 from app import db
-from typing import Dict
-from flask import Response, jsonify, send_file
+from app.emojis import normalize_reaction
+from app.graphs import (
+    GraphOptions,
+    graph_cache,
+    reaction_distribution,
+    render_in_worker,
+)
+from app.leaderboard import Leaderboard
+from app.serialization import PostRow, ReactionRow, UserRow, serializer
+from app.streaming import stream_response
+from typing import Dict, List, Tuple
+from sqlalchemy import exists, insert, tuple_
+from flask import Response, current_app, jsonify, send_file
+
+# The biggest page size a client can request with the limit parameter
+MAX_PAGE_LIMIT = 1000
+# The biggest number of items a client can send to the bulk endpoints
+MAX_BULK_ITEMS = 1000
 
 
 class Users(db.Model):
@@ -21,6 +29,12 @@ class Users(db.Model):
     last_name = db.Column(db.String(100))
     email = db.Column(db.String(100), unique=True)
     total_reactions = db.Column(db.Integer, default=0)
+    # Maintained by app.post_summaries
+    post_count = db.Column(db.Integer, default=0)
+    latest_posts = db.Column(db.JSON, default=list)
+
+    # Backs the keyset pagination of the leaderboard
+    __table_args__ = (db.Index("ix_users_total_reactions_id", "total_reactions", "id"),)
 
     def __init__(
         self,
@@ -32,6 +46,17 @@ class Users(db.Model):
         self.last_name = last_name
         self.email = email
 
+    def to_row(self, reactions_format: str = "list") -> UserRow:
+        return UserRow(
+            self.id,
+            self.first_name,
+            self.last_name,
+            self.email,
+            self.total_reactions,
+            self.post_count,
+            self.latest_posts,
+        )
+
     @staticmethod
     def validate_email(email: str) -> bool:
         if re.match(r"[^@]+@[^@]+\.[^@]+", email):
@@ -39,9 +64,18 @@ class Users(db.Model):
         return False
 
     @staticmethod
-    def user_validation_errors(data: Dict) -> None | Response:
+    def email_exists(email: str) -> bool:
+        # EXISTS stops at the first matching row of the unique index
+        # instead of loading the matching users
+        return db.session.query(exists().where(Users.email == email)).scalar()
+
+    @staticmethod
+    def user_validation_errors(
+        data: Dict, check_database: bool = True
+    ) -> None | Response:
         """Returns None if there are not errors during the validation otherwise
-        returns a Response with json containing all the error messages"""
+        returns a Response with json containing all the error messages
+        (the bulk endpoints do the database checks separately)"""
 
         response: Dict[str, Dict] = {"errors": {}}
 
@@ -71,6 +105,8 @@ class Users(db.Model):
         for var, var_name in zip(
             (first_name, last_name, email), ("first_name", "last_name", "email")
         ):
+            if f"invalid_{var_name}_type" in response["errors"]:
+                continue
             if len(var) > 100:
                 response["errors"][
                     f"invalid_{var_name}_length"
@@ -83,13 +119,48 @@ class Users(db.Model):
             response["errors"]["invalid_email_format"] = "email format is invalid"
 
         # Validating that there is no user with such email
-        if len(list(Users.query.filter_by(email=email))) != 0:
+        if (
+            check_database
+            and "invalid_email_type" not in response["errors"]
+            and Users.email_exists(email)
+        ):
             response["errors"]["invalid_email"] = "user with such email already exists"
 
         if len(response["errors"]) == 0:
             return None
         return jsonify(response)
 
+    @staticmethod
+    def users_bulk_validation_errors(items: List) -> List[Dict[str, str]]:
+        """Returns the errors of each of the items (empty if the item is valid),
+        checking all the emails against the database with a single query"""
+
+        items_errors = [
+            bulk_item_validation_errors(item, Users.user_validation_errors)
+            for item in items
+        ]
+
+        # Validating that there are no users with such emails
+        # neither in the database nor earlier in the same request
+        emails = {
+            item["email"] for item, errors in zip(items, items_errors) if not errors
+        }
+        taken_emails = {
+            email
+            for (email,) in db.session.query(Users.email).filter(
+                Users.email.in_(emails)
+            )
+        }
+
+        for item, errors in zip(items, items_errors):
+            if errors:
+                continue
+            if item["email"] in taken_emails:
+                errors["invalid_email"] = "user with such email already exists"
+            taken_emails.add(item["email"])
+
+        return items_errors
+
     # Maybe it doesn't make sense for this function to be in Users class,
     # but I can't think of a better place for it to be right now
     @staticmethod
@@ -116,13 +187,88 @@ class Users(db.Model):
             return None
         return jsonify(response)
 
+    @staticmethod
+    def pagination_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
+
+        response: Dict[str, Dict] = {"errors": {}}
+
+        # Both of the parameters are optional,
+        # without the limit the whole list is returned
+        limit = data.get("limit")
+        cursor = data.get("cursor")
+
+        # Validating the limit
+        # (bool is a subclass of int, so it has to be excluded separately)
+        if limit is not None and (
+            not isinstance(limit, int)
+            or isinstance(limit, bool)
+            or not (1 <= limit <= MAX_PAGE_LIMIT)
+        ):
+            response["errors"][
+                "invalid_limit"
+            ] = f"limit should be an int between 1 and {MAX_PAGE_LIMIT}"
+
+        # Validating the cursor, which is the next_cursor of the previous page
+        if cursor is not None and (
+            not isinstance(cursor, str) or not re.fullmatch(r"-?\d+:\d+", cursor)
+        ):
+            response["errors"][
+                "invalid_cursor"
+            ] = "cursor should be a next_cursor string returned by the previous page"
+
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
+    @staticmethod
+    def stream_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
+
+        response: Dict[str, Dict] = {"errors": {}}
+
+        # The parameter is optional, without it the response isn't streamed
+        stream = data.get("stream")
+
+        # Validating the content of the variable
+        if stream is not None and stream != "json" and stream != "ndjson":
+            response["errors"][
+                "invalid_stream"
+            ] = "stream should be a string containing either 'json' or 'ndjson'"
+
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
+    @staticmethod
+    def list_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
+
+        response: Dict[str, Dict] = {"errors": {}}
+
+        # Validating the sort_type, the pagination and the streaming parts of the request
+        for validation_errors in (
+            Users.sort_type_validation_errors(data),
+            Users.pagination_validation_errors(data),
+            Users.stream_validation_errors(data),
+        ):
+            if validation_errors:
+                response["errors"].update(validation_errors.json["errors"])
+
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
     @staticmethod
     def leaderboard_validation_errors(data: Dict) -> None | Response:
         """Returns None if there are not errors during the validation otherwise
         returns a Response with json containing all the error messages"""
 
-        # Validating the sort_type part of the request
-        validation_errors = Users.sort_type_validation_errors(data)
+        # Validating the sort_type and the pagination parts of the request
+        validation_errors = Users.list_validation_errors(data)
         if validation_errors:
             response: Dict[str, Dict] = validation_errors.json
         else:
@@ -141,57 +287,185 @@ class Users(db.Model):
                 "invalid_data_type"
             ] = "data_type should be a string containing either 'list' or 'graph'"
 
+        # Validating the options of the graph or of the list
+        if result_type == "graph":
+            validation_errors = Users.graph_validation_errors(data)
+        else:
+            validation_errors = Users.expand_validation_errors(data)
+        if validation_errors:
+            response["errors"].update(validation_errors.json["errors"])
+
         if len(response["errors"]) == 0:
             return None
         return jsonify(response)
 
     @staticmethod
-    def get_leaderboard(data_type: str, sort_type: str) -> Response:
-        # Getting a list of users in the ascending or descending order
-        if sort_type == "asc":
-            users = list(Users.query.order_by(Users.total_reactions))
-        else:
-            users = list(Users.query.order_by(Users.total_reactions.desc()))
+    def expand_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
 
-        match data_type:
-            case "list":
-                response = {"users": users}
+        response: Dict[str, Dict] = {"errors": {}}
 
-                return Response(
-                    json.dumps(response, cls=CustomJSONEncoder),
-                    mimetype="application/json",
-                )
-            case "graph":
-                # Preparing data for the graph
-                users_reaction_count = np.array(
-                    [user.total_reactions for user in users]
-                )
-                users_names_with_ids = np.array(
-                    [
-                        f"{user.first_name} {user.last_name} (id: {user.id})"
-                        for user in users
-                    ]
-                )
+        # The parameter is optional, without it only the summary of the posts is returned
+        expand = data.get("expand")
+
+        # Validating the content of the variable
+        if expand is not None and expand != "posts":
+            response["errors"][
+                "invalid_expand"
+            ] = "expand should be a string containing 'posts'"
+
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
+    @staticmethod
+    def graph_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
+
+        response: Dict[str, Dict] = {"errors": {}}
 
-                # Clearing the figure to prevent previous graph overriding the current one
-                plt.clf()
+        # All the parameters are optional, the defaults are taken from the config
+        graph_type = data.get("graph_type")
+        image_format = data.get("image_format")
+        max_size = current_app.config["GRAPH_MAX_SIZE"]
 
-                # Creating a graph from the data with matplotlib.pyplot
-                plt.bar(users_names_with_ids, users_reaction_count, color="blue")
-                plt.xticks(rotation=10)
-                plt.xlabel("User")
-                plt.ylabel("Reaction count")
-                plt.title("Users leaderboard")
-                plt.gcf().set_size_inches(8, 7)
+        # Validating the content of the variables
+        if (
+            graph_type is not None
+            and graph_type != "top"
+            and graph_type != "distribution"
+        ):
+            response["errors"][
+                "invalid_graph_type"
+            ] = "graph_type should be a string containing either 'top' or 'distribution'"
 
-                # Deleting the old graph if it exists
-                if os.path.exists("static/images/users_leaderboard.png"):
-                    os.remove("static/images/users_leaderboard.png")
+        if image_format is not None and image_format != "png" and image_format != "svg":
+            response["errors"][
+                "invalid_image_format"
+            ] = "image_format should be a string containing either 'png' or 'svg'"
+
+        # (bool is a subclass of int, so it has to be excluded separately)
+        for name in ("width", "height"):
+            size = data.get(name)
+            if size is not None and (
+                not isinstance(size, int)
+                or isinstance(size, bool)
+                or not (100 <= size <= max_size)
+            ):
+                response["errors"][
+                    f"invalid_{name}"
+                ] = f"{name} should be an int between 100 and {max_size}"
 
-                # Saving the new graph
-                plt.savefig("app/static/images/users_leaderboard.png", dpi=100)
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
+    @staticmethod
+    def get_leaderboard(
+        data_type: str,
+        sort_type: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        stream: str | None = None,
+        graph_options: Dict | None = None,
+        expand_posts: bool = False,
+    ) -> Response:
+        if data_type == "graph":
+            return Users.get_leaderboard_graph(
+                sort_type, limit, cursor, **(graph_options or {})
+            )
 
-                return send_file("static/images/users_leaderboard.png")
+        # Imported here, because app.read_models imports this module
+        from app import read_models
+
+        # Only the columns in the json are selected and the posts are loaded
+        # for all the users at once (for every batch of the users when streaming)
+        # if they are expanded
+        query = read_models.users_query()
+
+        def to_rows(users: List) -> List[UserRow]:
+            return read_models.user_rows(users, expand_posts)
+
+        # Getting a list of users in the ascending or descending order
+        if stream is not None:
+            query = order_by_reactions(query, Users, sort_type, cursor)
+            if limit is not None:
+                query = query.limit(limit)
+            return stream_response("users", query, stream, to_rows)
+        elif limit is None:
+            users, next_cursor = paginate(query, Users, sort_type, cursor=cursor)
+            users = to_rows(users)
+        else:
+            # A page is taken from the in-memory leaderboard,
+            # so only the users on the page are loaded from the database
+            ids, next_cursor = leaderboard_cache.page(sort_type, limit, cursor)
+            users = read_models.users_in_order(ids, expand_posts)
+
+        response = {"users": users}
+        if limit is not None:
+            response["next_cursor"] = next_cursor
+
+        return Response(serializer.dumps(response), mimetype="application/json")
+
+    @staticmethod
+    def get_leaderboard_graph(
+        sort_type: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        graph_type: str = "top",
+        image_format: str | None = None,
+        width: int | None = None,
+        height: int | None = None,
+    ) -> Response:
+        config = current_app.config
+        options = GraphOptions(
+            graph_type,
+            image_format or config["GRAPH_FORMAT"],
+            width or config["GRAPH_WIDTH"],
+            height or config["GRAPH_HEIGHT"],
+        )
+
+        # Drawing more bars than that makes the graph unreadable anyway
+        max_users = config["GRAPH_MAX_USERS"]
+        limit = max_users if limit is None else min(limit, max_users)
+
+        ids, _ = leaderboard_cache.page(sort_type, limit, cursor)
+
+        # The graph only has to be rendered again when the leaderboard changes
+        key = (leaderboard_cache.version, sort_type, limit, cursor, options)
+        graph = graph_cache.get(key)
+
+        if graph is None:
+            # Imported here, because app.read_models imports this module
+            from app.read_models import graph_entries
+
+            users = graph_entries(ids)
+            labels = [
+                f"{user.first_name} {user.last_name} (id: {user.id})" for user in users
+            ]
+            reaction_counts = [user.total_reactions for user in users]
+
+            # The histogram of all the users is computed here, so only
+            # a few numbers are drawn (and sent to the rendering process)
+            distribution = None
+            if graph_type == "distribution":
+                distribution = reaction_distribution(
+                    leaderboard_cache.totals(), config["GRAPH_DISTRIBUTION_BUCKETS"]
+                )
+
+            graph = render_in_worker(
+                config["GRAPH_RENDER_PROCESSES"],
+                labels,
+                reaction_counts,
+                options,
+                distribution,
+            )
+            graph_cache.put(key, graph, config["GRAPH_CACHE_SIZE"])
+
+        mimetype = "image/svg+xml" if options.image_format == "svg" else "image/png"
+        return send_file(io.BytesIO(graph), mimetype=mimetype)
 
 
 class Posts(db.Model):
@@ -202,14 +476,46 @@ class Posts(db.Model):
 
     author_id = db.Column(db.Integer, db.ForeignKey("users.id"))
 
+    # Backs the sorted (and paginated) listing of the posts of a user
+    # and any other lookup of the posts by the author
+    __table_args__ = (
+        db.Index("ix_posts_author_id_total_reactions", "author_id", "total_reactions"),
+    )
+
+    # Loaded lazily for a single post, but read paths that serialize many posts
+    # should load it with selectinload(Posts.reactions) to avoid a query per post
+    reactions = db.relationship("Reactions", order_by="Reactions.id")
+    # The most popular reactions go first in the summaries
+    reaction_counts = db.relationship(
+        "PostReactionCounts",
+        order_by=lambda: (
+            PostReactionCounts.count.desc(),
+            PostReactionCounts.reaction,
+        ),
+    )
+
     def __init__(self, author_id: int, text: str) -> None:
         self.author_id = author_id
         self.text = text
 
+    def to_row(self, reactions_format: str = "list") -> PostRow:
+        if reactions_format == "summary":
+            reactions = {
+                reaction_count.reaction: reaction_count.count
+                for reaction_count in self.reaction_counts
+            }
+        else:
+            reactions = [reaction.reaction for reaction in self.reactions]
+
+        return PostRow(self.id, self.author_id, self.text, reactions)
+
     @staticmethod
-    def post_validation_errors(data: Dict) -> None | Response:
+    def post_validation_errors(
+        data: Dict, check_database: bool = True
+    ) -> None | Response:
         """Returns None if there are not errors during the validation otherwise
-        returns a Response with json containing all the error messages"""
+        returns a Response with json containing all the error messages
+        (the bulk endpoints do the database checks separately)"""
 
         response: Dict[str, Dict] = {"errors": {}}
 
@@ -232,13 +538,99 @@ class Posts(db.Model):
                 ] = f"{var_name} should be {article} {var_type.__name__}"
 
         # Validating that there is a user with such id
-        if Users.query.get(author_id) is None:
+        if (
+            check_database
+            and "invalid_author_id_type" not in response["errors"]
+            and not db.session.query(exists().where(Users.id == author_id)).scalar()
+        ):
             response["errors"]["invalid_author_id"] = "user with such id doesn't exist"
 
         if len(response["errors"]) == 0:
             return None
         return jsonify(response)
 
+    @staticmethod
+    def reactions_format_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
+
+        response: Dict[str, Dict] = {"errors": {}}
+
+        # The parameter is optional, the full list of the reactions is the default
+        reactions_format = data.get("reactions", "list")
+
+        # Validating the content of the variable
+        if reactions_format != "list" and reactions_format != "summary":
+            response["errors"][
+                "invalid_reactions"
+            ] = "reactions should be a string containing either 'list' or 'summary'"
+
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
+    @staticmethod
+    def search_validation_errors(data: Dict) -> None | Response:
+        """Returns None if there are not errors during the validation otherwise
+        returns a Response with json containing all the error messages"""
+
+        response: Dict[str, Dict] = {"errors": {}}
+
+        # The query is required, the limit and the cursor are optional
+        query = data.get("q")
+        limit = data.get("limit")
+        cursor = data.get("cursor")
+
+        # Validating the query, only its words are searched for
+        if not isinstance(query, str) or not re.search(r"\w", query):
+            response["errors"][
+                "invalid_query"
+            ] = "q should be a string containing at least one word"
+
+        # Validating the limit (the query parameters are strings)
+        if limit is not None and (
+            not limit.isdecimal() or not (1 <= int(limit) <= MAX_PAGE_LIMIT)
+        ):
+            response["errors"][
+                "invalid_limit"
+            ] = f"limit should be an int between 1 and {MAX_PAGE_LIMIT}"
+
+        # Validating the cursor, which is the next_cursor of the previous page
+        if cursor is not None and not re.fullmatch(r"\d+:\d+:\d+", cursor):
+            response["errors"][
+                "invalid_cursor"
+            ] = "cursor should be a next_cursor string returned by the previous page"
+
+        if len(response["errors"]) == 0:
+            return None
+        return jsonify(response)
+
+    @staticmethod
+    def posts_bulk_validation_errors(items: List) -> List[Dict[str, str]]:
+        """Returns the errors of each of the items (empty if the item is valid),
+        checking all the authors against the database with a single query"""
+
+        items_errors = [
+            bulk_item_validation_errors(item, Posts.post_validation_errors)
+            for item in items
+        ]
+
+        # Validating that there are users with such ids
+        authors_ids = existing_ids(
+            Users,
+            {
+                item["author_id"]
+                for item, errors in zip(items, items_errors)
+                if not errors
+            },
+        )
+
+        for item, errors in zip(items, items_errors):
+            if not errors and item["author_id"] not in authors_ids:
+                errors["invalid_author_id"] = "user with such id doesn't exist"
+
+        return items_errors
+
 
 class Reactions(db.Model):
     # Database model
@@ -248,15 +640,29 @@ class Reactions(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey("posts.id"))
     author_id = db.Column(db.Integer, db.ForeignKey("users.id"))
 
+    # Back the lookups of the reactions by the post and by the author.
+    # The second columns make them covering for the counts grouped by the other column,
+    # which are used when deleting posts and users
+    __table_args__ = (
+        db.Index("ix_reactions_post_id_author_id", "post_id", "author_id"),
+        db.Index("ix_reactions_author_id_post_id", "author_id", "post_id"),
+    )
+
     def __init__(self, author_id: int, post_id: int, reaction: str) -> None:
         self.author_id = author_id
         self.post_id = post_id
         self.reaction = reaction
 
+    def to_row(self, reactions_format: str = "list") -> ReactionRow:
+        return ReactionRow(self.id, self.post_id, self.author_id, self.reaction)
+
     @staticmethod
-    def reaction_validation_errors(post_id: int, data: Dict) -> None | Response:
+    def reaction_validation_errors(
+        post_id: int, data: Dict, check_database: bool = True
+    ) -> None | Response:
         """Returns None if there are not errors during the validation otherwise
-        returns a Response with json containing all the error messages"""
+        returns a Response with json containing all the error messages
+        (the bulk endpoints do the database checks separately)"""
 
         response: Dict[str, Dict] = {"errors": {}}
 
@@ -279,68 +685,231 @@ class Reactions(db.Model):
                 ] = f"{var_name} should be {article} {var_type.__name__}"
 
         # Validating that reaction is an emoji
-        # emoji.is_emoji additionally checks
+        # normalize_reaction additionally checks
         # that the string contains only one emoji not multiple
         if ("invalid_reaction_type" not in response["errors"]) and (
-            not (emoji.is_emoji(emoji.emojize(reaction)))
+            normalize_reaction(reaction) is None
         ):
             response["errors"]["invalid_reaction"] = (
                 "reaction should be a single emoji,"
                 "or a string in the following format - :unicode_emoji_CLDR_short_name:"
             )
 
-        # Validating that a post with such id exists
-        if Posts.query.get(post_id) is None:
-            response["errors"]["invalid_post_id"] = "post with such id doesn't exist"
+        # Validating that a post and a user with such ids exist
+        # (both are checked with one query, the user id only if it's an int)
+        if check_database:
+            user_id_checked = "invalid_user_id_type" not in response["errors"]
+            post_exists, user_exists = db.session.query(
+                exists().where(Posts.id == post_id),
+                exists().where(Users.id == (user_id if user_id_checked else None)),
+            ).one()
 
-        # Validating that a user with such id exists
-        if Users.query.get(user_id) is None:
-            response["errors"]["invalid_user_id"] = "user with such id doesn't exist"
+            if not post_exists:
+                response["errors"][
+                    "invalid_post_id"
+                ] = "post with such id doesn't exist"
+
+            if user_id_checked and not user_exists:
+                response["errors"][
+                    "invalid_user_id"
+                ] = "user with such id doesn't exist"
 
         if len(response["errors"]) == 0:
             return None
         return jsonify(response)
 
+    @staticmethod
+    def reactions_bulk_validation_errors(items: List) -> List[Dict[str, str]]:
+        """Returns the errors of each of the items (empty if the item is valid),
+        checking all the posts and the users against the database with two queries"""
+
+        def validation_errors(item: Dict, check_database: bool) -> None | Response:
+            # Unlike the single reaction, the post id is a part of the item
+            try:
+                post_id = item["post_id"]
+            except KeyError:
+                return jsonify(
+                    {"errors": {"invalid_json_format": "json format is invalid"}}
+                )
+            if not isinstance(post_id, int):
+                return jsonify(
+                    {"errors": {"invalid_post_id_type": "post_id should be an int"}}
+                )
+            return Reactions.reaction_validation_errors(post_id, item, check_database)
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Users):
-            data = {
-                "id": obj.id,
-                "first_name": obj.first_name,
-                "last_name": obj.last_name,
-                "email": obj.email,
-                "total_reactions": obj.total_reactions,
-                "posts": [],
-            }
+        items_errors = [
+            bulk_item_validation_errors(item, validation_errors) for item in items
+        ]
 
-            posts = Posts.query.filter_by(author_id=obj.id)
+        # Validating that there are posts and users with such ids
+        valid_items = [item for item, errors in zip(items, items_errors) if not errors]
+        posts_ids = existing_ids(Posts, {item["post_id"] for item in valid_items})
+        users_ids = existing_ids(Users, {item["user_id"] for item in valid_items})
 
-            for post in posts:
-                data["posts"].append(post.text)
+        for item, errors in zip(items, items_errors):
+            if errors:
+                continue
+            if item["post_id"] not in posts_ids:
+                errors["invalid_post_id"] = "post with such id doesn't exist"
+            if item["user_id"] not in users_ids:
+                errors["invalid_user_id"] = "user with such id doesn't exist"
 
-            return data
-        if isinstance(obj, Posts):
-            data = {
-                "id": obj.id,
-                "author_id": obj.author_id,
-                "text": obj.text,
-                "reactions": [],
-            }
+        return items_errors
 
-            reactions = Reactions.query.filter_by(post_id=obj.id)
 
-            for reaction in reactions:
-                data["reactions"].append(reaction.reaction)
+# Kept up to date by the views which change total_reactions of the users
+leaderboard_cache = Leaderboard(
+    lambda: db.session.query(Users.total_reactions, Users.id)
+)
+
+
+def bulk_validation_errors(data) -> None | Response:
+    """Returns None if there are not errors during the validation otherwise
+    returns a Response with json containing all the error messages"""
+
+    response: Dict[str, Dict] = {"errors": {}}
+
+    # Validating the json format
+    if not isinstance(data, list):
+        response["errors"]["invalid_json_format"] = "json should be a list of items"
+        return jsonify(response)
+
+    # Validating the number of the items
+    if not (1 <= len(data) <= MAX_BULK_ITEMS):
+        response["errors"][
+            "invalid_items_count"
+        ] = f"the number of items should be between 1 and {MAX_BULK_ITEMS}"
+
+    if len(response["errors"]) == 0:
+        return None
+    return jsonify(response)
+
+
+def bulk_item_validation_errors(item, validation_errors) -> Dict[str, str]:
+    """Runs the validation_errors function of a single item without the database checks
+    and returns the errors as a dict (empty if the item is valid)"""
+
+    if not isinstance(item, dict):
+        return {"invalid_json_format": "json format is invalid"}
+
+    errors = validation_errors(item, check_database=False)
+    if errors:
+        return errors.json["errors"]
+    return {}
+
+
+def bulk_results(
+    items_errors: List[Dict[str, str]], created_items: List[Dict]
+) -> List[Dict]:
+    """Merges the errors of the invalid items with the results of the created ones
+    (given in the order of the valid items) back into the order of the request"""
+
+    created_items_iterator = iter(created_items)
+    return [
+        {"errors": errors} if errors else next(created_items_iterator)
+        for errors in items_errors
+    ]
+
+
+def insert_many(model: type[db.Model], rows: List[Dict]) -> List[int]:
+    """Inserts the rows with multi-row INSERT ... VALUES ... RETURNING statements
+    (SQLAlchemy batches the executemany into them) and returns their ids
+    in the same order as the rows"""
+
+    if not rows:
+        return []
+
+    # RETURNING doesn't guarantee the order of the rows and asking SQLAlchemy to sort them
+    # (sort_by_parameter_order) makes it insert the rows one by one on SQLite,
+    # so the returned rows are matched back by the values of their columns
+    # (the rows with the same values are interchangeable)
+    columns = list(rows[0])
+    ids_by_values: Dict[tuple, deque] = defaultdict(deque)
+    for id, *values in db.session.execute(
+        insert(model).returning(
+            model.id, *(getattr(model, column) for column in columns)
+        ),
+        rows,
+    ):
+        ids_by_values[tuple(values)].append(id)
+
+    return [
+        ids_by_values[tuple(row[column] for column in columns)].popleft()
+        for row in rows
+    ]
+
+
+def existing_ids(model: type[Users] | type[Posts], ids: set) -> set:
+    """Returns the ids out of the given ones, for which the rows exist"""
+
+    if not ids:
+        return set()
+    return {id for (id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def paginate(
+    query,
+    model: type[Users] | type[Posts],
+    sort_type: str,
+    limit: int | None = None,
+    cursor: str | None = None,
+) -> Tuple[List, str | None]:
+    """Orders the query by (total_reactions, id) and returns a page of it
+    together with the cursor of the next page (None if it's the last page).
+    Without the limit the whole query is returned."""
+
+    query = order_by_reactions(query, model, sort_type, cursor)
+
+    if limit is None:
+        return list(query), None
+
+    # Fetching one extra row to find out whether there is a next page
+    rows = list(query.limit(limit + 1))
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, f"{rows[-1].total_reactions}:{rows[-1].id}"
+
+
+def order_by_reactions(
+    query,
+    model: type[Users] | type[Posts],
+    sort_type: str,
+    cursor: str | None = None,
+):
+    """Orders the query by (total_reactions, id) starting after the cursor"""
+
+    key = tuple_(model.total_reactions, model.id)
+
+    # Seeking to the cursor instead of using an offset,
+    # so getting any page costs the same as getting the first one
+    if cursor is not None:
+        total_reactions, last_id = map(int, cursor.split(":"))
+        if sort_type == "asc":
+            query = query.filter(key > tuple_(total_reactions, last_id))
+        else:
+            query = query.filter(key < tuple_(total_reactions, last_id))
+
+    if sort_type == "asc":
+        query = query.order_by(model.total_reactions, model.id)
+    else:
+        query = query.order_by(model.total_reactions.desc(), model.id.desc())
+
+    return query
+
+
+class PostReactionCounts(db.Model):
+    # Database model
+    # Number of each of the reactions on each of the posts, maintained by app/counters.py,
+    # so the summaries of the posts reactions don't have to load all the reactions
+    __tablename__ = "post_reaction_counts"
+
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+    reaction = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
 
-            return data
-        if isinstance(obj, Reactions):
-            data = {
-                "id": obj.id,
-                "post_id": obj.post_id,
-                "author_id": obj.author_id,
-                "reaction": obj.reaction,
-            }
 
-            return data
-        return super(CustomJSONEncoder, self).default(obj)
+# The json of the models is built from their rows (see app/serialization.py)
+for model in (Users, Posts, Reactions):
+    serializer.register(model, model.to_row)
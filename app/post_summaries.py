@@ -0,0 +1,124 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from flask import current_app
+from sqlalchemy import bindparam, func, select, update
+
+from app import db
+from app.models import Users, Posts
+
+# The json of a user contains the number of the posts of the user and the latest of them
+# (users.post_count and users.latest_posts), so its size doesn't grow with the history.
+# The new posts are added to them, they are only recomputed from the posts
+# when some of the posts of the user are deleted
+
+
+def refresh_post_summaries(user_ids: Iterable[int] | None = None) -> None:
+    """Recomputes post_count and latest_posts of the users with the given ids
+    (of all the users if user_ids is None) with one SELECT and one executemany UPDATE"""
+
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+
+    latest_count = current_app.config["USER_LATEST_POSTS"]
+
+    # Numbering the posts of every user from the newest one only reads the index
+    # of the posts by the author, the texts are only read for the latest posts
+    number = (
+        func.row_number()
+        .over(partition_by=Posts.author_id, order_by=Posts.id.desc())
+        .label("number")
+    )
+    post_count = func.count().over(partition_by=Posts.author_id).label("post_count")
+    numbered = select(Posts.author_id, Posts.id, post_count, number)
+    if user_ids is not None:
+        numbered = numbered.where(Posts.author_id.in_(user_ids))
+    numbered = numbered.subquery()
+
+    post_counts: Dict[int, int] = {}
+    latest_posts: Dict[int, List[Dict]] = defaultdict(list)
+    for author_id, id, count, text in db.session.execute(
+        select(numbered.c.author_id, numbered.c.id, numbered.c.post_count, Posts.text)
+        .join(Posts, Posts.id == numbered.c.id)
+        .where(numbered.c.number <= latest_count)
+        .order_by(numbered.c.author_id, numbered.c.number)
+    ):
+        post_counts[author_id] = count
+        latest_posts[author_id].append({"id": id, "text": text})
+
+    # The users without posts get the empty summaries
+    if user_ids is None:
+        user_ids = db.session.scalars(select(Users.id)).all()
+        if not user_ids:
+            return
+
+    table = Users.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam("user_id"))
+        .values(
+            post_count=bindparam("post_count"), latest_posts=bindparam("latest_posts")
+        ),
+        [
+            {
+                "user_id": id,
+                "post_count": post_counts.get(id, 0),
+                "latest_posts": latest_posts.get(id, []),
+            }
+            for id in user_ids
+        ],
+    )
+
+
+def add_post_summaries(posts: Iterable[Dict]) -> None:
+    """Adds the new posts ({"id", "author_id", "text"}) to post_count and latest_posts
+    of their authors with one SELECT and one executemany UPDATE"""
+
+    posts_by_author: Dict[int, List[Dict]] = defaultdict(list)
+    for post in posts:
+        posts_by_author[post["author_id"]].append(
+            {"id": post["id"], "text": post["text"]}
+        )
+    if not posts_by_author:
+        return
+
+    latest_count = current_app.config["USER_LATEST_POSTS"]
+
+    # The concurrent requests adding the posts of the same author wait for each other
+    # here until the commit, so they don't overwrite each other's latest posts.
+    # SQLite already holds the lock of the whole database since the INSERT of the posts.
+    # On PostgreSQL the foreign key check of that INSERT holds FOR KEY SHARE locks
+    # on the authors, which FOR NO KEY UPDATE (unlike FOR UPDATE) doesn't conflict with,
+    # and the rows are locked in the order of the ids, so the requests don't deadlock
+    current_posts = db.session.execute(
+        select(Users.id, Users.latest_posts)
+        .where(Users.id.in_(posts_by_author))
+        .order_by(Users.id)
+        .with_for_update(key_share=True)
+    ).all()
+
+    table = Users.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam("user_id"))
+        .values(
+            post_count=table.c.post_count + bindparam("added"),
+            latest_posts=bindparam("latest_posts"),
+        ),
+        [
+            {
+                "user_id": id,
+                "added": len(posts_by_author[id]),
+                # Sorted by the ids, as a transaction which has started earlier
+                # could commit the older posts after the newer ones
+                "latest_posts": sorted(
+                    posts_by_author[id] + (latest_posts or []),
+                    key=lambda post: post["id"],
+                    reverse=True,
+                )[:latest_count],
+            }
+            for id, latest_posts in current_posts
+        ],
+    )
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Sequence
+
+from app import db
+from app.models import Users, Posts, Reactions, PostReactionCounts
+from app.serialization import ExpandedUserRow, PostRow, UserRow
+
+# The read paths serializing many rows select only the columns they need
+# into tuples instead of loading the ORM instances, which skips the identity map,
+# the attribute instrumentation and the columns which aren't used
+
+# The biggest number of ids in one IN (...) list
+IN_CHUNK_SIZE = 500
+
+
+class GraphEntry(NamedTuple):
+    id: int
+    first_name: str
+    last_name: str
+    total_reactions: int
+
+
+def users_query():
+    """Returns a query of the columns of the users needed for their json.
+    Its rows are turned into UserRows by user_rows"""
+
+    return db.session.query(
+        Users.id,
+        Users.first_name,
+        Users.last_name,
+        Users.email,
+        Users.total_reactions,
+        Users.post_count,
+        Users.latest_posts,
+    )
+
+
+def user_rows(
+    users: Sequence, expand_posts: bool = False
+) -> List[UserRow] | List[ExpandedUserRow]:
+    """Returns the UserRows of the rows of users_query. With expand_posts returns
+    the ExpandedUserRows with the texts of all their posts, which are loaded
+    with one query per IN_CHUNK_SIZE users"""
+
+    if not expand_posts:
+        return [UserRow(*user) for user in users]
+
+    texts: Dict[int, List[str]] = defaultdict(list)
+    for ids in _chunks([user.id for user in users]):
+        for author_id, text in (
+            db.session.query(Posts.author_id, Posts.text)
+            .filter(Posts.author_id.in_(ids))
+            .order_by(Posts.id)
+        ):
+            texts[author_id].append(text)
+
+    return [ExpandedUserRow(*user, texts.get(user.id, [])) for user in users]
+
+
+def users_in_order(
+    ids: List[int], expand_posts: bool = False
+) -> List[UserRow] | List[ExpandedUserRow]:
+    """Returns the UserRows of the users with the given ids in the order of the ids
+    (the users which don't exist anymore are skipped)"""
+
+    users_by_id = {user.id: user for user in users_query().filter(Users.id.in_(ids))}
+    return user_rows([users_by_id[id] for id in ids if id in users_by_id], expand_posts)
+
+
+def graph_entries(ids: List[int]) -> List[GraphEntry]:
+    """Returns the names and the reaction counts of the users with the given ids
+    in the order of the ids (the users which don't exist anymore are skipped)"""
+
+    entries_by_id = {
+        row.id: GraphEntry(*row)
+        for row in db.session.query(
+            Users.id, Users.first_name, Users.last_name, Users.total_reactions
+        ).filter(Users.id.in_(ids))
+    }
+    return [entries_by_id[id] for id in ids if id in entries_by_id]
+
+
+def posts_query(author_id: int):
+    """Returns a query of the columns of the posts of the user needed for their json
+    and for their ordering. Its rows are turned into PostRows by post_rows"""
+
+    return db.session.query(
+        Posts.id, Posts.author_id, Posts.text, Posts.total_reactions
+    ).filter(Posts.author_id == author_id)
+
+
+def post_rows(posts: Sequence, reactions_format: str = "list") -> List[PostRow]:
+    """Returns the PostRows of the rows of posts_query with either the lists
+    or the summaries of their reactions, which are loaded with one query
+    per IN_CHUNK_SIZE posts"""
+
+    reactions: Dict[int, List[str] | Dict[str, int]] = {}
+    for ids in _chunks([post.id for post in posts]):
+        if reactions_format == "summary":
+            # The most popular reactions go first, the same as in Posts.reaction_counts
+            for post_id, reaction, count in (
+                db.session.query(
+                    PostReactionCounts.post_id,
+                    PostReactionCounts.reaction,
+                    PostReactionCounts.count,
+                )
+                .filter(PostReactionCounts.post_id.in_(ids))
+                .order_by(PostReactionCounts.count.desc(), PostReactionCounts.reaction)
+            ):
+                reactions.setdefault(post_id, {})[reaction] = count
+        else:
+            for post_id, reaction in (
+                db.session.query(Reactions.post_id, Reactions.reaction)
+                .filter(Reactions.post_id.in_(ids))
+                .order_by(Reactions.id)
+            ):
+                reactions.setdefault(post_id, []).append(reaction)
+
+    return [
+        PostRow(
+            post.id,
+            post.author_id,
+            post.text,
+            reactions.get(post.id, {} if reactions_format == "summary" else []),
+        )
+        for post in posts
+    ]
+
+
+def _chunks(ids: List[int]) -> Iterator[List[int]]:
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start : start + IN_CHUNK_SIZE]
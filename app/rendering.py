@@ -0,0 +1,61 @@
+import io
+from typing import List
+
+# The object-oriented API is used instead of matplotlib.pyplot,
+# because pyplot keeps a global current figure, which isn't thread-safe
+from matplotlib.figure import Figure
+
+from app.graphs import Distribution, GraphOptions
+
+DPI = 100
+
+
+def render_leaderboard_graph(
+    labels: List[str],
+    reaction_counts: List[int],
+    options: GraphOptions,
+    distribution: Distribution | None = None,
+) -> bytes:
+    """Returns a png or an svg with a bar chart of the users reaction counts
+    and, if the distribution is given, the histogram of the reaction counts of all the users
+    below it"""
+
+    figure = Figure(
+        figsize=(options.width / DPI, options.height / DPI),
+        dpi=DPI,
+        layout="constrained",
+    )
+    if distribution is None:
+        axes = figure.subplots()
+    else:
+        axes, distribution_axes = figure.subplots(2, 1)
+
+    axes.bar(labels, reaction_counts, color="blue")
+    # The names of many users only fit when they are vertical
+    axes.tick_params(axis="x", labelrotation=10 if len(labels) <= 10 else 90)
+    axes.set_xlabel("User")
+    axes.set_ylabel("Reaction count")
+    axes.set_title("Users leaderboard")
+
+    if distribution is not None:
+        # One bar per bucket labeled with the range of the reaction counts in it
+        edges = distribution.edges
+        bucket_labels = [
+            str(start) if end - start == 1 else f"{start}-{end - 1}"
+            for start, end in zip(edges, edges[1:])
+        ]
+        distribution_axes.bar(bucket_labels, distribution.counts, color="blue")
+        distribution_axes.set_yscale("log")
+        distribution_axes.tick_params(axis="x", labelrotation=45)
+        distribution_axes.set_xlabel("Reaction count")
+        distribution_axes.set_ylabel("Users")
+        distribution_axes.set_title(
+            "All users: "
+            + ", ".join(
+                f"p{p} {value:g}" for p, value in distribution.percentiles.items()
+            )
+        )
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=options.image_format)
+    return buffer.getvalue()
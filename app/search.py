@@ -0,0 +1,147 @@
+import re
+from typing import List, Tuple
+
+from flask import current_app
+from sqlalchemy import column, func, literal, select, table, text
+
+from app import db
+from app.models import Posts
+
+# Full-text search of the posts. On SQLite the texts are indexed by the posts_fts
+# FTS5 table, which the triggers on the posts table keep in sync with every insert,
+# update and delete (including the set-based deletes of the users and the bulk inserts).
+# The other databases fall back to scanning the texts with LIKE
+
+posts_fts = table("posts_fts", column("rowid"), column("rank"), column("posts_fts"))
+
+# An external content table: the index only stores the tokens,
+# the texts are read from the posts table
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts "
+    "USING fts5(text, content='posts', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF text ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO posts_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+SEARCH_INDEX_OBJECTS = {
+    "posts_fts",
+    "posts_fts_insert",
+    "posts_fts_delete",
+    "posts_fts_update",
+}
+
+
+def search_index_supported() -> bool:
+    return db.engine.dialect.name == "sqlite"
+
+
+def create_search_index() -> None:
+    """Creates the posts_fts table and its triggers if any of them is missing
+    and fills the index from the existing posts"""
+
+    existing = set(
+        db.session.scalars(
+            text("SELECT name FROM sqlite_master WHERE name LIKE 'posts_fts%'")
+        )
+    )
+    if SEARCH_INDEX_OBJECTS <= existing:
+        return
+
+    for statement in SEARCH_INDEX_DDL:
+        db.session.execute(text(statement))
+    # The posts changed while a trigger was missing wouldn't be found otherwise
+    db.session.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+    db.session.commit()
+
+
+def search_terms(query: str) -> List[Tuple[str, bool]]:
+    """Returns the words of the query with whether each of them is a prefix
+    (ends with *), the rest of the characters are ignored"""
+
+    return [(word, prefix == "*") for word, prefix in re.findall(r"(\w+)(\*?)", query)]
+
+
+def match_expression(terms: List[Tuple[str, bool]]) -> str:
+    """Returns the FTS5 query matching the posts containing all the terms.
+    Every word is quoted, so nothing in it is interpreted as the FTS5 syntax"""
+
+    return " ".join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in terms)
+
+
+def search_posts(
+    query: str, limit: int, cursor: str | None = None
+) -> Tuple[List, str | None]:
+    """Returns a page of the posts containing all the words of the query, the most
+    relevant (by bm25) first, together with the cursor of the next page
+    (None if it's the last page). The rows have the columns of read_models.posts_query
+    """
+
+    terms = search_terms(query)
+
+    # The cursor contains the number of the posts on the previous pages
+    # and the range of the ids of the searched posts, so all the pages search
+    # the same posts. Unlike models.paginate, the pages aren't sought by the rank,
+    # because the ranks of all the posts change with every new post
+    if cursor is not None:
+        offset, min_id, max_id = (int(part) for part in cursor.split(":"))
+    else:
+        offset, min_id = 0, 0
+        max_id = db.session.scalar(select(func.max(Posts.id))) or 0
+
+    # The page of the ids is found first, so only the posts on the page
+    # are read from the posts table
+    if search_index_supported():
+        id, rank = posts_fts.c.rowid, posts_fts.c.rank
+        match = posts_fts.c.posts_fts.match(match_expression(terms))
+
+        # Computing bm25 costs about the same for every matching post, so the words
+        # found in most of the posts would take seconds to rank. Only the newest
+        # SEARCH_MAX_RANKED matching posts up to max_id are ranked (FTS5 only reads
+        # the ids in the range of the rowid conditions). The range of a cursor
+        # is narrowed down the same way, as the clients can send any range
+        min_id = max(
+            min_id,
+            db.session.scalar(
+                select(id)
+                .where(match, id <= max_id)
+                .order_by(id.desc())
+                .offset(current_app.config["SEARCH_MAX_RANKED"] - 1)
+                .limit(1)
+            )
+            or 0,
+        )
+        page = select(id.label("id"), rank.label("rank")).where(
+            match, id.between(min_id, max_id)
+        )
+    else:
+        # Without the index all the posts are equally relevant and all of them are
+        # listed at once
+        id, rank, min_id = Posts.id, literal(0.0), 0
+        page = select(id.label("id"), rank.label("rank")).where(id <= max_id)
+        for word, _ in terms:
+            page = page.where(Posts.text.ilike(f"%{word}%"))
+
+    # Fetching one extra row to find out whether there is a next page
+    # (the lower rank is the better one)
+    page = page.order_by(rank, id).offset(offset).limit(limit + 1).subquery()
+    rows = (
+        db.session.query(
+            Posts.id, Posts.author_id, Posts.text, Posts.total_reactions, page.c.rank
+        )
+        .join(page, page.c.id == Posts.id)
+        .order_by(page.c.rank, page.c.id)
+        .all()
+    )
+    if len(rows) > limit:
+        return rows[:limit], f"{offset + limit}:{min_id}:{max_id}"
+
+    # After the ranked posts the next pages rank the older matching posts
+    # the same way, the most relevant of the next SEARCH_MAX_RANKED of them first
+    if min_id > 0 and db.session.scalar(select(id).where(match, id < min_id).limit(1)):
+        return rows, f"0:0:{min_id - 1}"
+    return rows, None
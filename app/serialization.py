@@ -0,0 +1,114 @@
+import dataclasses
+import json
+from typing import Any, Callable, Dict, List
+
+# orjson is optional, the standard json module is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Plain rows the json of the models is built from. They only hold the values
+# which end up in the json, so the encoder doesn't touch the ORM instances
+
+
+@dataclasses.dataclass(slots=True)
+class UserRow:
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+    total_reactions: int
+    post_count: int
+    # The latest USER_LATEST_POSTS posts ({"id": 1, "text": "..."}), the newest first
+    latest_posts: List[Dict]
+
+
+@dataclasses.dataclass(slots=True)
+class ExpandedUserRow:
+    # UserRow with the texts of all the posts of the user (expand=posts)
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+    total_reactions: int
+    post_count: int
+    latest_posts: List[Dict]
+    posts: List[str]
+
+
+@dataclasses.dataclass(slots=True)
+class PostRow:
+    id: int
+    author_id: int
+    text: str
+    # The list of the reactions or their summary ({"👍": 2, "❤️": 1})
+    reactions: List[str] | Dict[str, int]
+
+
+@dataclasses.dataclass(slots=True)
+class ReactionRow:
+    id: int
+    post_id: int
+    author_id: int
+    reaction: str
+
+
+class Serializer:
+    """Turns the responses into json with orjson if it's installed,
+    otherwise with the standard json module (see the JSON_BACKEND config option).
+
+    Objects of the registered classes (the models) are converted to rows by their
+    to_row functions, which are found with one dict lookup by the class of the object"""
+
+    def __init__(self) -> None:
+        self._to_row: Dict[type, Callable[[Any, str], Any]] = {}
+        self.backend = "orjson" if orjson is not None else "json"
+
+    def configure(self, backend: str) -> None:
+        """Sets the backend, which is either "auto", "orjson" or "json" """
+
+        if backend == "auto":
+            backend = "orjson" if orjson is not None else "json"
+        elif backend not in ("orjson", "json"):
+            raise ValueError(f"Unknown JSON_BACKEND {backend!r}")
+        elif backend == "orjson" and orjson is None:
+            raise RuntimeError("JSON_BACKEND is orjson, but orjson isn't installed")
+
+        self.backend = backend
+
+    def register(self, cls: type, to_row: Callable[[Any, str], Any]) -> None:
+        """to_row is called with an object of the class and the reactions format
+        ("list" or "summary") and returns the value serialized instead of the object"""
+
+        self._to_row[cls] = to_row
+
+    def dumps(self, obj, reactions_format: str = "list") -> bytes:
+        """Returns the utf-8 json of the object. Both backends produce the same output.
+        With reactions_format="summary" the posts contain the number of each of the reactions
+        instead of the list of all the reactions"""
+
+        def default(value):
+            to_row = self._to_row.get(type(value))
+            if to_row is not None:
+                value = to_row(value, reactions_format)
+                # orjson serializes the rows itself
+                if self.backend == "orjson":
+                    return value
+
+            # The json module needs the rows as dicts
+            if dataclasses.is_dataclass(value):
+                return {field: getattr(value, field) for field in value.__slots__}
+            raise TypeError(
+                f"Object of type {type(value).__name__} is not JSON serializable"
+            )
+
+        if self.backend == "orjson":
+            return orjson.dumps(obj, default=default)
+        return json.dumps(
+            obj, default=default, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+
+serializer = Serializer()
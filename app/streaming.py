@@ -0,0 +1,53 @@
+from typing import Callable, Iterator
+
+from flask import Response, current_app, stream_with_context
+
+from app.serialization import serializer
+
+
+def stream_response(
+    key: str,
+    query,
+    stream_format: str,
+    convert: Callable[[list], list] | None = None,
+) -> Response:
+    """Returns a Response which serializes the rows of the query while sending them.
+    The query is fetched in batches of STREAM_BATCH_SIZE rows, so the memory usage
+    doesn't depend on the number of the rows.
+
+    stream_format "json" produces the same {key: [...]} json as the non-streaming responses,
+    "ndjson" produces one json object per line.
+    convert is called with every batch of the rows and returns the items to serialize"""
+
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+
+    def batches() -> Iterator[list]:
+        batch = []
+        for row in query.yield_per(batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield convert(batch) if convert is not None else batch
+                batch = []
+        if batch:
+            yield convert(batch) if convert is not None else batch
+
+    def generate_json() -> Iterator[bytes]:
+        yield b"{" + serializer.dumps(key) + b":["
+        separator = b""
+        for batch in batches():
+            # The whole batch is serialized at once without the surrounding brackets
+            yield separator + serializer.dumps(batch)[1:-1]
+            separator = b","
+        yield b"]}"
+
+    def generate_ndjson() -> Iterator[bytes]:
+        for batch in batches():
+            yield b"".join(serializer.dumps(row) + b"\n" for row in batch)
+
+    # The request context (and the database session with it)
+    # has to stay available while the response is being generated
+    if stream_format == "ndjson":
+        return Response(
+            stream_with_context(generate_ndjson()), mimetype="application/x-ndjson"
+        )
+    return Response(stream_with_context(generate_json()), mimetype="application/json")
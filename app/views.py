@@ -1,12 +1,34 @@
+from app import db, read_models
+from app.cache import entity_cache, post_key, reaction_key, user_key
+from app.counters import discard_reactions, reaction_counts, record_reactions
+from app.emojis import normalize_reaction
+from app.metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from app.post_summaries import add_post_summaries, refresh_post_summaries
+from app.search import search_posts
+from app.serialization import PostRow, serializer
+from app.streaming import stream_response
+from app.models import (
+    Users,
+    Posts,
+    Reactions,
+    PostReactionCounts,
+    paginate,
+    order_by_reactions,
+    bulk_validation_errors,
+    bulk_results,
+    insert_many,
+    leaderboard_cache,
+)
+from collections import Counter
+from flask import Blueprint, current_app, request, Response, jsonify
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
 from typing import List
-from emoji import emojize
-from app import app, db
-from app.models import Users, Posts, Reactions, CustomJSONEncoder
-from flask import request, Response, jsonify
-import json
 
+api = Blueprint("api", __name__)
 
-@app.post("/users/create")
+
+@api.post("/users/create")
 def user_create() -> Response:
     # Checking the content type
     if request.content_type != "application/json":
@@ -29,71 +51,181 @@ def user_create() -> Response:
 
     # Adding the user to the database
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request has created a user with the same email after the validation
+        db.session.rollback()
+        return jsonify(
+            {"errors": {"invalid_email": "user with such email already exists"}}
+        )
 
-    return Response(
-        json.dumps(user, cls=CustomJSONEncoder), mimetype="application/json"
+    leaderboard_cache.add_user(user.id)
+
+    return Response(serializer.dumps(user), mimetype="application/json")
+
+
+@api.post("/users/bulk")
+def users_bulk() -> Response:
+    # Checking the content type
+    if request.content_type != "application/json":
+        return jsonify(
+            {
+                "errors": {
+                    "invalid_content_type": "The content type should be application/json"
+                }
+            }
+        )
+
+    data = request.get_json()
+
+    # Validating the data
+    validation_errors = bulk_validation_errors(data)
+    if validation_errors:
+        return validation_errors
+    items_errors = Users.users_bulk_validation_errors(data)
+
+    # Adding all the valid users to the database at once
+    ids = insert_many(
+        Users,
+        [
+            {
+                "first_name": item["first_name"],
+                "last_name": item["last_name"],
+                "email": item["email"],
+            }
+            for item, errors in zip(data, items_errors)
+            if not errors
+        ],
     )
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request has created a user with one of the emails after the validation
+        db.session.rollback()
+        return jsonify(
+            {"errors": {"invalid_email": "user with such email already exists"}}
+        )
 
+    for id in ids:
+        leaderboard_cache.add_user(id)
 
-@app.get("/users/<int:user_id>")
+    return jsonify({"results": bulk_results(items_errors, [{"id": id} for id in ids])})
+
+
+@api.get("/users/<int:user_id>")
 def user_info(user_id: int) -> Response:
-    # Checking whether a user with such id exists or not
-    query_result = Users.query.get(user_id)
-    if query_result:
-        user: Users = query_result
-        return Response(
-            json.dumps(user, cls=CustomJSONEncoder), mimetype="application/json"
-        )
+    # Validating the query parameters
+    validation_errors = Users.expand_validation_errors(request.args)
+    if validation_errors:
+        return validation_errors
+
+    expand_posts = request.args.get("expand") == "posts"
+
+    def serialize() -> bytes | None:
+        # Checking whether a user with such id exists or not
+        # (only the columns in the json are selected, the posts only if they are expanded)
+        rows = read_models.users_in_order([user_id], expand_posts)
+        if rows:
+            return serializer.dumps(rows[0])
+        return None
+
+    # The database is only queried if the user isn't cached
+    response = entity_cache.json_response(user_key(user_id, expand_posts), serialize)
+    if response is not None:
+        return response
     return jsonify(
         {"errors": {"invalid_user_id": "The user with such id doesn't exist"}}
     )
 
 
-@app.post("/users/delete/<int:user_id>")
+@api.post("/users/delete/<int:user_id>")
 def delete_user(user_id: int) -> Response:
     # Checking whether a user with such id exists or not
     query_result = Users.query.get(user_id)
     if query_result:
-        user: Users = query_result
-
-        # Deleting all the posts
-        # (There is code repetition here, but if I used the delete_post, delete_reaction functions
-        # it would cause multiple requests to the database instead of 1)
-        posts: List[Posts] = Posts.query.filter_by(author_id=user.id)
-        for post in posts:
-            # Deleting all the reactions from the post
-            reactions: List[Reactions] = list(
-                Reactions.query.filter_by(post_id=post.id)
-            )
-            for reaction in reactions:
-                # Decreasing the user total reactions count
-                user = Users.query.get(reaction.author_id)
-                user.total_reactions -= 1
-
-                # Decreasing the post total reactions count
-                post = Posts.query.get(reaction.post_id)
-                post.total_reactions -= 1
-
-                # Deleting the reaction from the database
-                db.session.delete(reaction)
-
-            # Deleting the post from the database
-            db.session.delete(post)
+        # Everything is done with a few set-based statements in one transaction,
+        # so the cost doesn't depend on the number of reactions
+        user_posts_ids = select(Posts.id).where(Posts.author_id == user_id)
+        deleted_reactions = or_(
+            Reactions.post_id.in_(user_posts_ids), Reactions.author_id == user_id
+        )
 
-        # Deleting the user from the database
-        db.session.delete(user)
+        # Decreasing the total reactions counts of the users,
+        # who reacted to the posts of the user
+        users_deltas = {
+            id: -count
+            for id, count in reaction_counts(
+                Reactions.author_id, Reactions.post_id.in_(user_posts_ids)
+            ).items()
+            if id != user_id
+        }
+
+        # Decreasing the total reactions counts and the reactions summaries
+        # of the posts, which the user reacted to
+        reactions_deltas = {
+            key: -count
+            for key, count in reaction_counts(
+                (Reactions.post_id, Reactions.reaction),
+                Reactions.author_id == user_id,
+                Reactions.post_id.not_in(user_posts_ids),
+            ).items()
+        }
+        posts_deltas = Counter()
+        for (id, _), delta in reactions_deltas.items():
+            posts_deltas[id] += delta
+
+        # In the write-behind mode the decrements are buffered together with
+        # the increments of the reactions, which might not be written yet
+        record_reactions(users_deltas, posts_deltas, reactions_deltas)
+
+        # Deleting the reactions, the posts and the user from the database
+        # (the ids of the deleted reactions and posts are returned for the cache invalidation)
+        reactions_ids = db.session.scalars(
+            delete(Reactions)
+            .where(deleted_reactions)
+            .returning(Reactions.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.execute(
+            delete(PostReactionCounts)
+            .where(PostReactionCounts.post_id.in_(user_posts_ids))
+            .execution_options(synchronize_session=False)
+        )
+        posts_ids = db.session.scalars(
+            delete(Posts)
+            .where(Posts.author_id == user_id)
+            .returning(Posts.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.execute(
+            delete(Users)
+            .where(Users.id == user_id)
+            .execution_options(synchronize_session=False)
+        )
 
         # Commiting all the change to the database
         db.session.commit()
 
+        # The buffered changes of the deleted rows would go to the new rows
+        # reusing their ids
+        discard_reactions(users=[user_id], posts=posts_ids)
+
+        leaderboard_cache.apply_deltas(users_deltas)
+        leaderboard_cache.remove_user(user_id)
+        entity_cache.invalidate(
+            users=[user_id, *users_deltas],
+            posts=[*posts_ids, *posts_deltas],
+            reactions=reactions_ids,
+        )
+
         return Response()
     return jsonify(
         {"errors": {"invalid_user_id": "The user with such id doesn't exist"}}
     )
 
 
-@app.post("/users/<int:user_id>/posts")
+@api.post("/users/<int:user_id>/posts")
 def user_posts(user_id: int) -> Response:
     # Checking whether a user with such id exists or not
     if Users.query.get(user_id):
@@ -110,25 +242,41 @@ def user_posts(user_id: int) -> Response:
         data = request.get_json()
 
         # Validating the data
-        data_validation_errors = Users.sort_type_validation_errors(data)
-        if data_validation_errors:
-            return data_validation_errors
-
-        if data["sort_type"] == "asc":
-            posts: List[Posts] = list(
-                Posts.query.filter_by(author_id=user_id).order_by(Posts.total_reactions)
-            )
-        else:
-            posts: List[Posts] = list(
-                Posts.query.filter_by(author_id=user_id).order_by(
-                    Posts.total_reactions.desc()
-                )
+        for data_validation_errors in (
+            Users.list_validation_errors(data),
+            Posts.reactions_format_validation_errors(data),
+        ):
+            if data_validation_errors:
+                return data_validation_errors
+
+        # Only the columns in the json are selected and the reactions
+        # (or their summaries) of all the posts are loaded with one additional query
+        reactions_format = data.get("reactions", "list")
+        query = read_models.posts_query(user_id)
+
+        def to_rows(posts: List) -> List[PostRow]:
+            return read_models.post_rows(posts, reactions_format)
+
+        # Serializing the posts while sending them instead of building the whole response
+        if data.get("stream") is not None:
+            query = order_by_reactions(
+                query, Posts, data["sort_type"], data.get("cursor")
             )
+            if data.get("limit") is not None:
+                query = query.limit(data["limit"])
+            return stream_response("posts", query, data["stream"], to_rows)
 
-        response = {"posts": posts}
+        posts, next_cursor = paginate(
+            query, Posts, data["sort_type"], data.get("limit"), data.get("cursor")
+        )
+
+        response = {"posts": to_rows(posts)}
+        if data.get("limit") is not None:
+            response["next_cursor"] = next_cursor
 
         return Response(
-            json.dumps(response, cls=CustomJSONEncoder), mimetype="application/json"
+            serializer.dumps(response),
+            mimetype="application/json",
         )
 
     return jsonify(
@@ -136,7 +284,7 @@ def user_posts(user_id: int) -> Response:
     )
 
 
-@app.post("/users/leaderboard")
+@api.post("/users/leaderboard")
 def users_leaderboard() -> Response:
     data = request.get_json()
 
@@ -145,10 +293,25 @@ def users_leaderboard() -> Response:
     if data_validation_errors:
         return data_validation_errors
 
-    return Users.get_leaderboard(data["data_type"], data["sort_type"])
+    # Only the options given in the request override the config
+    graph_options = {
+        name: data[name]
+        for name in ("graph_type", "image_format", "width", "height")
+        if data.get(name) is not None
+    }
+
+    return Users.get_leaderboard(
+        data["data_type"],
+        data["sort_type"],
+        data.get("limit"),
+        data.get("cursor"),
+        data.get("stream"),
+        graph_options,
+        data.get("expand") == "posts",
+    )
 
 
-@app.post("/posts/create")
+@api.post("/posts/create")
 def post_create() -> Response:
     # Checking the content type
     if request.content_type != "application/json":
@@ -170,65 +333,169 @@ def post_create() -> Response:
     post = Posts(data["author_id"], data["text"])
 
     # Adding the post to the database
+    # and adding it to the summary of the posts of the author
     db.session.add(post)
+    db.session.flush()
+    add_post_summaries(
+        [{"id": post.id, "author_id": post.author_id, "text": post.text}]
+    )
+    db.session.commit()
+
+    # The json of the author contains the summary and the texts of the posts
+    entity_cache.invalidate(users=[data["author_id"]])
+
+    return Response(serializer.dumps(post), mimetype="application/json")
+
+
+@api.post("/posts/bulk")
+def posts_bulk() -> Response:
+    # Checking the content type
+    if request.content_type != "application/json":
+        return jsonify(
+            {
+                "errors": {
+                    "invalid_content_type": "The content type should be application/json"
+                }
+            }
+        )
+
+    data = request.get_json()
+
+    # Validating the data
+    validation_errors = bulk_validation_errors(data)
+    if validation_errors:
+        return validation_errors
+    items_errors = Posts.posts_bulk_validation_errors(data)
+
+    # Adding all the valid posts to the database at once
+    rows = [
+        {"author_id": item["author_id"], "text": item["text"]}
+        for item, errors in zip(data, items_errors)
+        if not errors
+    ]
+    ids = insert_many(Posts, rows)
+    add_post_summaries({"id": id, **row} for id, row in zip(ids, rows))
     db.session.commit()
 
+    authors_ids = {row["author_id"] for row in rows}
+
+    entity_cache.invalidate(users=authors_ids)
+
+    return jsonify({"results": bulk_results(items_errors, [{"id": id} for id in ids])})
+
+
+@api.get("/posts/search")
+def posts_search() -> Response:
+    # Validating the query parameters
+    for validation_errors in (
+        Posts.search_validation_errors(request.args),
+        Posts.reactions_format_validation_errors(request.args),
+    ):
+        if validation_errors:
+            return validation_errors
+
+    limit = int(request.args.get("limit", current_app.config["SEARCH_PAGE_SIZE"]))
+    reactions_format = request.args.get("reactions", "list")
+
+    # The most relevant posts go first, the reactions of all the posts on the page
+    # are loaded with one additional query
+    posts, next_cursor = search_posts(
+        request.args["q"], limit, request.args.get("cursor")
+    )
+
     return Response(
-        json.dumps(post, cls=CustomJSONEncoder), mimetype="application/json"
+        serializer.dumps(
+            {
+                "posts": read_models.post_rows(posts, reactions_format),
+                "next_cursor": next_cursor,
+            }
+        ),
+        mimetype="application/json",
     )
 
 
-@app.get("/posts/<int:post_id>")
+@api.get("/posts/<int:post_id>")
 def post_info(post_id: int) -> Response:
-    # Checking whether a post with such id exists or not
-    query_result = Posts.query.get(post_id)
-    if query_result:
-        post: Posts = query_result
-        return Response(
-            json.dumps(post, cls=CustomJSONEncoder), mimetype="application/json"
-        )
+    # Validating the query parameters
+    validation_errors = Posts.reactions_format_validation_errors(request.args)
+    if validation_errors:
+        return validation_errors
+
+    reactions_format = request.args.get("reactions", "list")
+
+    def serialize() -> str | None:
+        # Checking whether a post with such id exists or not
+        query_result = Posts.query.get(post_id)
+        if query_result:
+            post: Posts = query_result
+            return serializer.dumps(post, reactions_format)
+        return None
+
+    # The database is only queried if the post isn't cached
+    response = entity_cache.json_response(
+        post_key(post_id, reactions_format), serialize
+    )
+    if response is not None:
+        return response
     return jsonify(
         {"errors": {"invalid_post_id": "The post with such id doesn't exist"}}
     )
 
 
-@app.post("/posts/delete/<int:post_id>")
+@api.post("/posts/delete/<int:post_id>")
 def delete_post(post_id: int) -> Response:
     # Checking whether a post with such id exists or not
     query_result = Posts.query.get(post_id)
     if query_result:
-        post: Posts = query_result
-
-        # Deleting all the reactions from the post
-        reactions: List[Reactions] = list(Reactions.query.filter_by(post_id=post_id))
-        for reaction in reactions:
-            # (There is code repetition here, but if I used the delete_reaction function
-            # it would cause multiple requests to the database instead of 1)
-
-            # Decreasing the user total reactions count
-            user = Users.query.get(reaction.author_id)
-            user.total_reactions -= 1
-
-            # Decreasing the post total reactions count
-            post = Posts.query.get(reaction.post_id)
-            post.total_reactions -= 1
-
-            # Deleting the reaction from the database
-            db.session.delete(reaction)
-
-        # Deleting the post from the database
-        db.session.delete(post)
+        author_id = query_result.author_id
+
+        # Decreasing the total reactions counts of the users,
+        # who reacted to the post, with one statement
+        # (buffered in the write-behind mode like the increments)
+        users_deltas = {
+            id: -count
+            for id, count in reaction_counts(
+                Reactions.author_id, Reactions.post_id == post_id
+            ).items()
+        }
+        record_reactions(users_deltas, {}, {})
+
+        # Deleting all the reactions from the post and the post itself
+        # (the ids of the deleted reactions are returned for the cache invalidation)
+        reactions_ids = db.session.scalars(
+            delete(Reactions)
+            .where(Reactions.post_id == post_id)
+            .returning(Reactions.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for statement in (
+            delete(PostReactionCounts).where(PostReactionCounts.post_id == post_id),
+            delete(Posts).where(Posts.id == post_id),
+        ):
+            db.session.execute(statement.execution_options(synchronize_session=False))
+
+        # Updating the summary of the posts of the author
+        refresh_post_summaries([author_id])
 
         # Commiting all the changes to the database
         db.session.commit()
 
+        # The buffered changes of the deleted post would go to the new post
+        # reusing its id
+        discard_reactions(posts=[post_id])
+
+        leaderboard_cache.apply_deltas(users_deltas)
+        entity_cache.invalidate(
+            users=[author_id, *users_deltas], posts=[post_id], reactions=reactions_ids
+        )
+
         return Response()
     return jsonify(
         {"errors": {"invalid_post_id": "The post with such id doesn't exist"}}
     )
 
 
-@app.post("/reactions/react/<int:post_id>")
+@api.post("/reactions/react/<int:post_id>")
 def react_to_post(post_id: int) -> Response:
     # Checking the content type
     if request.content_type != "application/json":
@@ -247,54 +514,116 @@ def react_to_post(post_id: int) -> Response:
     if validation_errors:
         return validation_errors
 
-    reaction = Reactions(data["user_id"], post_id, emojize(data["reaction"]))
+    reaction = Reactions(data["user_id"], post_id, normalize_reaction(data["reaction"]))
 
     # Adding the reaction to the database
     db.session.add(reaction)
+    db.session.flush()
 
-    # Increasing the post total reactions count
-    post = Posts.query.get(post_id)
-    post.total_reactions += 1
+    # Taking the values before the commit expires them,
+    # otherwise reading them would cost one more query
+    response = {"reaction_id": reaction.id, "reaction": reaction.reaction}
 
-    # Increasing the user total reactions count
-    user = Users.query.get(data["user_id"])
-    user.total_reactions += 1
+    # Increasing the post and the user total reactions counts
+    # and the reactions summary of the post
+    record_reactions(
+        {data["user_id"]: 1}, {post_id: 1}, {(post_id, reaction.reaction): 1}
+    )
 
     # Commiting all the changes to the database
     db.session.commit()
 
-    return jsonify({"reaction_id": reaction.id, "reaction": reaction.reaction})
+    leaderboard_cache.apply_deltas({data["user_id"]: 1})
+    entity_cache.invalidate(users=[data["user_id"]], posts=[post_id])
 
+    return jsonify(response)
 
-@app.get("/reactions/<int:reaction_id>")
-def reaction_info(reaction_id: int) -> Response:
-    # Checking whether a reaction with such id exists or not
-    query_result = Reactions.query.get(reaction_id)
-    if query_result:
-        reaction: Reactions = query_result
 
-        return Response(
-            json.dumps(reaction, cls=CustomJSONEncoder), mimetype="application/json"
+@api.post("/reactions/bulk")
+def reactions_bulk() -> Response:
+    # Checking the content type
+    if request.content_type != "application/json":
+        return jsonify(
+            {
+                "errors": {
+                    "invalid_content_type": "The content type should be application/json"
+                }
+            }
         )
+
+    data = request.get_json()
+
+    # Validating the data
+    validation_errors = bulk_validation_errors(data)
+    if validation_errors:
+        return validation_errors
+    items_errors = Reactions.reactions_bulk_validation_errors(data)
+
+    valid_items = [item for item, errors in zip(data, items_errors) if not errors]
+    rows = [
+        {
+            "author_id": item["user_id"],
+            "post_id": item["post_id"],
+            "reaction": normalize_reaction(item["reaction"]),
+        }
+        for item in valid_items
+    ]
+
+    # Adding all the valid reactions to the database at once
+    ids = insert_many(Reactions, rows)
+
+    # Increasing the total reactions counts of the users and the posts
+    # and the reactions summaries with one statement per table
+    posts_deltas = Counter(row["post_id"] for row in rows)
+    users_deltas = Counter(row["author_id"] for row in rows)
+    reactions_deltas = Counter((row["post_id"], row["reaction"]) for row in rows)
+    record_reactions(users_deltas, posts_deltas, reactions_deltas)
+
+    # Commiting all the changes to the database
+    db.session.commit()
+
+    leaderboard_cache.apply_deltas(users_deltas)
+    entity_cache.invalidate(users=users_deltas, posts=posts_deltas)
+
+    created_items = [
+        {"reaction_id": id, "reaction": row["reaction"]} for id, row in zip(ids, rows)
+    ]
+    return jsonify({"results": bulk_results(items_errors, created_items)})
+
+
+@api.get("/reactions/<int:reaction_id>")
+def reaction_info(reaction_id: int) -> Response:
+    def serialize() -> str | None:
+        # Checking whether a reaction with such id exists or not
+        query_result = Reactions.query.get(reaction_id)
+        if query_result:
+            reaction: Reactions = query_result
+            return serializer.dumps(reaction)
+        return None
+
+    # The database is only queried if the reaction isn't cached
+    response = entity_cache.json_response(reaction_key(reaction_id), serialize)
+    if response is not None:
+        return response
     return jsonify(
         {"errors": {"invalid_reaction_id": "The reaction with such id doesn't exist"}}
     )
 
 
-@app.post("/reactions/delete/<int:reaction_id>")
+@api.post("/reactions/delete/<int:reaction_id>")
 def delete_reaction(reaction_id: int) -> Response:
     # Checking whether a reaction with such id exists or not
     query_result = Reactions.query.get(reaction_id)
     if query_result:
         reaction: Reactions = query_result
 
-        # Decreasing the user total reactions count
-        user = Users.query.get(reaction.author_id)
-        user.total_reactions -= 1
-
-        # Decreasing the post total reactions count
-        post = Posts.query.get(reaction.post_id)
-        post.total_reactions -= 1
+        # Decreasing the user and the post total reactions counts
+        # and the reactions summary of the post
+        record_reactions(
+            {reaction.author_id: -1},
+            {reaction.post_id: -1},
+            {(reaction.post_id, reaction.reaction): -1},
+        )
 
         # Deleting the reaction from the database
         db.session.delete(reaction)
@@ -302,7 +631,47 @@ def delete_reaction(reaction_id: int) -> Response:
         # Commiting all the changes to the database
         db.session.commit()
 
+        leaderboard_cache.apply_deltas({reaction.author_id: -1})
+        entity_cache.invalidate(
+            users=[reaction.author_id],
+            posts=[reaction.post_id],
+            reactions=[reaction_id],
+        )
+
         return Response()
     return jsonify(
         {"errors": {"invalid_reaction_id": "The reaction with such id doesn't exist"}}
     )
+
+
+@api.get("/cache/stats")
+def cache_stats() -> Response:
+    return jsonify(entity_cache.stats())
+
+
+@api.get("/metrics")
+def metrics_info() -> Response:
+    # Validating the query parameters
+    metrics_format = request.args.get("format", "prometheus")
+    if metrics_format not in ("prometheus", "json"):
+        return jsonify(
+            {
+                "errors": {
+                    "invalid_format": "format should be a string containing "
+                    "either 'prometheus' or 'json'"
+                }
+            }
+        )
+
+    # The Prometheus text format by default, so the endpoint can be scraped
+    if metrics_format == "prometheus":
+        return Response(
+            metrics.to_prometheus(entity_cache.stats()),
+            content_type=PROMETHEUS_CONTENT_TYPE,
+        )
+
+    # Serialized in the original order, so the histogram buckets stay sorted
+    return Response(
+        serializer.dumps({**metrics.to_dict(), "entity_cache": entity_cache.stats()}),
+        mimetype="application/json",
+    )
@@ -0,0 +1,157 @@
+"""Compares the throughput of the threaded WSGI server and the ASGI mode (app/asgi.py)
+on the same generated database with many concurrent clients requesting
+the users, the posts and the reactions by id:
+
+    python benchmarks/asgi_load.py --concurrency 200 --duration 10 --slow-ms 50
+
+--slow-ms makes every client wait between sending the request line and the headers,
+like a client on a slow network does.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from data import ROOT, Dataset, create_benchmark_app, generate
+from report import percentile
+
+SERVERS = {
+    "wsgi": [sys.executable, "-m", "flask", "--app", "app", "run", "--port", "{port}"],
+    "asgi": [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.asgi:asgi_app",
+        "--port",
+        "{port}",
+        "--log-level",
+        "warning",
+    ],
+}
+
+
+async def request(port: int, path: str, slow: float) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\n".encode())
+        if slow:
+            await writer.drain()
+            await asyncio.sleep(slow)
+        writer.write(b"Host: localhost\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+
+        response = await reader.read()
+        return int(response.split(b" ", 2)[1])
+    finally:
+        writer.close()
+
+
+async def client(
+    port: int,
+    dataset: Dataset,
+    deadline: float,
+    slow: float,
+    latencies: list,
+    errors: list,
+) -> None:
+    while time.monotonic() < deadline:
+        path = random.choice(
+            [
+                f"/users/{random.randint(1, dataset.users)}",
+                f"/posts/{random.randint(1, dataset.posts)}",
+                f"/reactions/{random.randint(1, dataset.reactions)}",
+            ]
+        )
+        start = time.monotonic()
+        try:
+            status = await request(port, path, slow)
+        except OSError:
+            status = None
+        if status == 200:
+            latencies.append(time.monotonic() - start)
+        else:
+            errors.append(status)
+
+
+async def load(
+    port: int, dataset: Dataset, concurrency: int, duration: float, slow: float
+) -> None:
+    latencies: list = []
+    errors: list = []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(
+        *(
+            client(port, dataset, deadline, slow, latencies, errors)
+            for _ in range(concurrency)
+        )
+    )
+
+    latencies.sort()
+    print(
+        f"  {len(latencies) / duration:8.0f} requests/s, "
+        f"p50 {percentile(latencies, 0.5) * 1000:.0f}ms, "
+        f"p95 {percentile(latencies, 0.95) * 1000:.0f}ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.0f}ms, {len(errors)} errors"
+    )
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server didn't start on port {port}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--slow-ms", type=float, default=0)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--modes", nargs="+", default=list(SERVERS))
+    parser.add_argument("--port", type=int, default=8700)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "load.db")
+        os.environ["FLASK_SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
+        if args.no_cache:
+            os.environ["FLASK_ENTITY_CACHE_SIZE"] = "0"
+        with create_benchmark_app(database_path).app_context():
+            dataset = generate(args.users)
+
+        for mode in args.modes:
+            command = [part.format(port=args.port) for part in SERVERS[mode]]
+            server = subprocess.Popen(
+                command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_for_port(args.port)
+                print(f"{mode}:")
+                asyncio.run(
+                    load(
+                        args.port,
+                        dataset,
+                        args.concurrency,
+                        args.duration,
+                        args.slow_ms / 1000,
+                    )
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Synthetic data shared by the benchmarks.
+
+The numbers of the posts of the users and of the reactions to the posts follow
+a power law like on a real social network: most users write a few posts which get
+a few reactions, while a few of them write hundreds of posts with thousands of reactions.
+"""
+
+import os
+import random
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from flask import Flask
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.counters import rebuild_post_reaction_counts
+from app.migrations import upgrade_database
+from app.post_summaries import refresh_post_summaries
+from app.models import Users, Posts, Reactions
+
+REACTIONS = ["👍", "❤️", "😂", "😮", "😢", "🔥"]
+REACTION_WEIGHTS = [40, 25, 15, 8, 7, 5]
+
+
+@dataclass
+class Dataset:
+    # The ids of the generated rows are 1 to the number of the rows
+    users: int
+    posts: int
+    reactions: int
+
+
+def power_law(rng: random.Random, alpha: float, maximum: int) -> int:
+    """Returns an integer from 0 to maximum, which is usually small but sometimes
+    very big (Pareto distribution, the smaller alpha is the heavier is the tail)"""
+
+    return min(int(rng.paretovariate(alpha)) - 1, maximum)
+
+
+def create_benchmark_app(database_path: str, config: Dict | None = None) -> Flask:
+    """Creates the app using the SQLite database at the path with the up to date schema"""
+
+    app = create_app(
+        {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_path}", **(config or {})}
+    )
+    with app.app_context():
+        upgrade_database()
+    return app
+
+
+def generate(
+    users: int,
+    seed: int = 0,
+    posts_alpha: float = 1.3,
+    reactions_alpha: float = 1.1,
+    max_posts: int = 1000,
+    max_reactions: int = 5000,
+) -> Dataset:
+    """Fills the empty database of the current app with the users, their posts
+    and the reactions to the posts with consistent reaction counters.
+    The same arguments always produce the same data"""
+
+    rng = random.Random(seed)
+
+    posts_authors = [
+        author_id
+        for author_id in range(1, users + 1)
+        for _ in range(power_law(rng, posts_alpha, max_posts))
+    ]
+    reactions = [
+        {
+            "author_id": rng.randint(1, users),
+            "post_id": post_id,
+            "reaction": rng.choices(REACTIONS, REACTION_WEIGHTS)[0],
+        }
+        for post_id in range(1, len(posts_authors) + 1)
+        for _ in range(power_law(rng, reactions_alpha, max_reactions))
+    ]
+
+    users_totals = Counter(reaction["author_id"] for reaction in reactions)
+    posts_totals = Counter(reaction["post_id"] for reaction in reactions)
+
+    db.session.execute(
+        insert(Users),
+        [
+            {
+                "first_name": f"First{id}",
+                "last_name": f"Last{id}",
+                "email": f"user{id}@example.com",
+                "total_reactions": users_totals[id],
+            }
+            for id in range(1, users + 1)
+        ],
+    )
+    db.session.execute(
+        insert(Posts),
+        [
+            {
+                "author_id": author_id,
+                "text": f"Post {id} of the user {author_id}",
+                "total_reactions": posts_totals[id],
+            }
+            for id, author_id in enumerate(posts_authors, 1)
+        ],
+    )
+    if reactions:
+        db.session.execute(insert(Reactions), reactions)
+    rebuild_post_reaction_counts()
+    refresh_post_summaries()
+    db.session.commit()
+
+    return Dataset(users, len(posts_authors), len(reactions))
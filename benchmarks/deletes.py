@@ -0,0 +1,148 @@
+"""Benchmark of POST /posts/delete and POST /users/delete of a post with many
+reactions on a generated database:
+
+    python benchmarks/deletes.py --reactions 200000 --save baseline.json
+    python benchmarks/deletes.py --reactions 200000 --compare baseline.json
+
+The first user has written both posts and the first post has all the reactions,
+left by random users. Every delete runs on a new database, as it removes the data.
+With --compare the exit code is 1 if the best time of any of the deletes
+became more than --threshold times slower or if any of them does more queries.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict
+
+from data import create_benchmark_app, REACTIONS
+from report import compare, save
+from sqlalchemy import event, insert
+
+from app import db
+from app.counters import rebuild_post_reaction_counts
+from app.models import Users, Posts, Reactions
+from app.post_summaries import refresh_post_summaries
+
+# The deletes and the paths of their requests
+DELETES = {
+    "delete_post": "/posts/delete/1",
+    "delete_user": "/users/delete/1",
+}
+
+
+def generate(users: int, reactions: int, seed: int = 0) -> None:
+    """Fills the empty database of the current app with the users, the two posts
+    of the first user and the reactions to the first post
+    with consistent reaction counters"""
+
+    rng = random.Random(seed)
+    rows = [
+        {
+            "author_id": rng.randint(1, users),
+            "post_id": 1,
+            "reaction": rng.choice(REACTIONS),
+        }
+        for _ in range(reactions)
+    ]
+    users_totals = Counter(row["author_id"] for row in rows)
+
+    db.session.execute(
+        insert(Users),
+        [
+            {
+                "first_name": f"First{id}",
+                "last_name": f"Last{id}",
+                "email": f"user{id}@example.com",
+                "total_reactions": users_totals[id],
+            }
+            for id in range(1, users + 1)
+        ],
+    )
+    db.session.execute(
+        insert(Posts),
+        [
+            {"author_id": 1, "text": "Popular post", "total_reactions": reactions},
+            {"author_id": 1, "text": "Another post", "total_reactions": 0},
+        ],
+    )
+    for start in range(0, reactions, 50000):
+        db.session.execute(insert(Reactions), rows[start : start + 50000])
+    rebuild_post_reaction_counts()
+    refresh_post_summaries()
+    db.session.commit()
+
+
+def measure(path: str, users: int, reactions: int) -> Dict[str, float]:
+    """Returns the time and the number of the queries of the request
+    deleting the data of a new database"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Generating and deleting the reactions is expected to be slow
+        app = create_benchmark_app(
+            os.path.join(directory, "deletes.db"), {"SLOW_QUERY_MS": None}
+        )
+        with app.app_context():
+            generate(users, reactions)
+
+            # Counting the statements sent to the database by the request
+            queries = [0]
+
+            @event.listens_for(db.engine, "before_cursor_execute")
+            def count_query(*_) -> None:
+                queries[0] += 1
+
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post(path)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200 or response.get_data():
+            raise RuntimeError(f"{path} returned {response.status} {response.data!r}")
+
+        with app.app_context():
+            db.engine.dispose()
+    return {"time": elapsed, "queries": queries[0]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reactions", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    args = parser.parse_args()
+
+    print(f"{args.users} users, 2 posts, {args.reactions} reactions to the first one")
+
+    results = {}
+    for name, path in DELETES.items():
+        runs = [measure(path, args.users, args.reactions) for _ in range(args.repeat)]
+        times = [run["time"] for run in runs]
+        results[name] = {
+            "best": min(times),
+            "median": statistics.median(times),
+            "queries": runs[0]["queries"],
+        }
+        print(
+            f"{name:12s} best {results[name]['best'] * 1e3:10.2f}ms  "
+            f"median {results[name]['median'] * 1e3:10.2f}ms  "
+            f"{results[name]['queries']:3d} queries"
+        )
+
+    if args.save:
+        save(args.save, results)
+    if args.compare and not compare(
+        args.compare, results, args.threshold, relative=("best",), exact=("queries",)
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Load driver requesting every endpoint of the API through the Flask test client
+on a generated database and reporting the latency percentiles, the throughput
+and the number of SQL queries per request of each route:
+
+    python benchmarks/load.py --users 10000 --requests 200 --save baseline.json
+    python benchmarks/load.py --users 10000 --requests 200 --compare baseline.json
+
+With --compare the exit code is 1 if the p50 latency of any of the routes
+became more than --threshold times slower or if any of them does more queries.
+The deletes run last, so the other routes see the whole generated data.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+from data import Dataset, create_benchmark_app, generate, REACTIONS
+from report import compare, percentile, save
+from sqlalchemy import event
+
+from app import db
+
+
+class Scenario(NamedTuple):
+    method: str
+    # Takes the random generator, the generated dataset and the number of the request
+    # and returns
+    # the path and the json of the request
+    request: Callable[[random.Random, Dataset, int], tuple]
+
+
+def new_user(rng: random.Random, dataset: Dataset, i: int) -> tuple:
+    return "/users/create", {
+        "first_name": "New",
+        "last_name": "User",
+        "email": f"new{i}@example.com",
+    }
+
+
+def new_users(rng: random.Random, dataset: Dataset, i: int) -> tuple:
+    return "/users/bulk", [
+        {"first_name": "New", "last_name": "User", "email": f"bulk{i}.{j}@example.com"}
+        for j in range(100)
+    ]
+
+
+def new_post(rng: random.Random, dataset: Dataset, i: int) -> tuple:
+    return "/posts/create", {"author_id": rng.randint(1, dataset.users), "text": "New"}
+
+
+def new_posts(rng: random.Random, dataset: Dataset, i: int) -> tuple:
+    return "/posts/bulk", [
+        {"author_id": rng.randint(1, dataset.users), "text": f"New {j}"}
+        for j in range(100)
+    ]
+
+
+def new_reaction(rng: random.Random, dataset: Dataset, i: int) -> tuple:
+    return f"/reactions/react/{rng.randint(1, dataset.posts)}", {
+        "user_id": rng.randint(1, dataset.users),
+        "reaction": rng.choice(REACTIONS),
+    }
+
+
+def new_reactions(rng: random.Random, dataset: Dataset, i: int) -> tuple:
+    return "/reactions/bulk", [
+        {
+            "user_id": rng.randint(1, dataset.users),
+            "post_id": rng.randint(1, dataset.posts),
+            "reaction": rng.choice(REACTIONS),
+        }
+        for _ in range(100)
+    ]
+
+
+# The routes in the order they are requested,
+# the deletes remove the ids from the end of the generated ones
+SCENARIOS: Dict[str, Scenario] = {
+    "user_info": Scenario(
+        "get", lambda rng, dataset, i: (f"/users/{rng.randint(1, dataset.users)}", None)
+    ),
+    "post_info": Scenario(
+        "get", lambda rng, dataset, i: (f"/posts/{rng.randint(1, dataset.posts)}", None)
+    ),
+    "post_info_summary": Scenario(
+        "get",
+        lambda rng, dataset, i: (
+            f"/posts/{rng.randint(1, dataset.posts)}?reactions=summary",
+            None,
+        ),
+    ),
+    "posts_search": Scenario(
+        "get",
+        lambda rng, dataset, i: (
+            f"/posts/search?q=user {rng.randint(1, dataset.users)}",
+            None,
+        ),
+    ),
+    "reaction_info": Scenario(
+        "get",
+        lambda rng, dataset, i: (
+            f"/reactions/{rng.randint(1, dataset.reactions)}",
+            None,
+        ),
+    ),
+    "user_posts": Scenario(
+        "post",
+        lambda rng, dataset, i: (
+            f"/users/{rng.randint(1, dataset.users)}/posts",
+            {"sort_type": "desc"},
+        ),
+    ),
+    "leaderboard_page": Scenario(
+        "post",
+        lambda rng, dataset, i: (
+            "/users/leaderboard",
+            {"data_type": "list", "sort_type": "desc", "limit": 100},
+        ),
+    ),
+    "leaderboard_graph": Scenario(
+        "post",
+        lambda rng, dataset, i: (
+            "/users/leaderboard",
+            {"data_type": "graph", "sort_type": "desc"},
+        ),
+    ),
+    "user_create": Scenario("post", new_user),
+    "users_bulk": Scenario("post", new_users),
+    "post_create": Scenario("post", new_post),
+    "posts_bulk": Scenario("post", new_posts),
+    "react_to_post": Scenario("post", new_reaction),
+    "reactions_bulk": Scenario("post", new_reactions),
+    "delete_reaction": Scenario(
+        "post",
+        lambda rng, dataset, i: (f"/reactions/delete/{dataset.reactions - i}", None),
+    ),
+    "delete_post": Scenario(
+        "post", lambda rng, dataset, i: (f"/posts/delete/{dataset.posts - i}", None)
+    ),
+    "delete_user": Scenario(
+        "post", lambda rng, dataset, i: (f"/users/delete/{dataset.users - i}", None)
+    ),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS))
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    args = parser.parse_args()
+
+    config = {"ENTITY_CACHE_SIZE": 0} if args.no_cache else {}
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(os.path.join(directory, "load.db"), config)
+        with app.app_context():
+            dataset = generate(args.users)
+
+            # Counting the statements sent to the database by the requests
+            queries = [0]
+
+            @event.listens_for(db.engine, "before_cursor_execute")
+            def count_query(*_) -> None:
+                queries[0] += 1
+
+        print(
+            f"{dataset.users} users, {dataset.posts} posts, "
+            f"{dataset.reactions} reactions"
+        )
+
+        rng = random.Random(0)
+        client = app.test_client()
+        results = {}
+        for name in args.only or SCENARIOS:
+            scenario = SCENARIOS[name]
+            latencies: List[float] = []
+            queries[0] = 0
+            started = time.perf_counter()
+            for i in range(args.requests):
+                path, json = scenario.request(rng, dataset, i)
+                start = time.perf_counter()
+                response = getattr(client, scenario.method)(path, json=json)
+                response.get_data()
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name}: {path} returned {response.status}")
+            elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            results[name] = {
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "throughput": args.requests / elapsed,
+                "queries": queries[0] / args.requests,
+            }
+            print(
+                f"{name:20s} p50 {results[name]['p50'] * 1000:8.2f}ms  "
+                f"p95 {results[name]['p95'] * 1000:8.2f}ms  "
+                f"p99 {results[name]['p99'] * 1000:8.2f}ms  "
+                f"{results[name]['throughput']:8.0f} requests/s  "
+                f"{results[name]['queries']:5.1f} queries"
+            )
+
+    if args.save:
+        save(args.save, results)
+    if args.compare and not compare(
+        args.compare, results, args.threshold, relative=("p50",), exact=("queries",)
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Microbenchmarks of the hot paths (the serialization, the validators and the leaderboard)
+on a generated database:
+
+    python benchmarks/micro.py --users 10000 --save baseline.json
+    python benchmarks/micro.py --users 10000 --compare baseline.json
+
+With --compare the exit code is 1 if the best time of any of the benchmarks
+became more than --threshold times slower.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict
+
+import emoji
+from data import create_benchmark_app, generate
+from report import compare, save
+
+from app import db
+from app.emojis import normalize_reaction
+from app.models import Users, Posts, Reactions, leaderboard_cache
+from app.read_models import post_rows, posts_query, users_in_order
+from app.serialization import serializer
+
+# Each of the benchmarks is a function which prepares its data
+# and returns the function being measured
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(function: Callable[[], Callable[[], object]]) -> Callable:
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+@benchmark
+def serialize_users_rows() -> Callable:
+    rows = users_in_order(list(range(1, 1001)))
+    return lambda: serializer.dumps({"users": rows})
+
+
+@benchmark
+def serialize_users_instances() -> Callable:
+    users = Users.query.filter(Users.id <= 1000).all()
+    return lambda: serializer.dumps({"users": users})
+
+
+@benchmark
+def serialize_post_summary() -> Callable:
+    post = db.session.get(Posts, 1)
+    post.reaction_counts
+    return lambda: serializer.dumps(post, "summary")
+
+
+@benchmark
+def validate_user() -> Callable:
+    data = {"first_name": "New", "last_name": "User", "email": "new@example.com"}
+    return lambda: Users.user_validation_errors(data)
+
+
+@benchmark
+def validate_users_bulk() -> Callable:
+    items = [
+        {"first_name": "New", "last_name": "User", "email": f"new{id}@example.com"}
+        for id in range(100)
+    ]
+    return lambda: Users.users_bulk_validation_errors(items)
+
+
+@benchmark
+def validate_post() -> Callable:
+    data = {"author_id": 1, "text": "New post"}
+    return lambda: Posts.post_validation_errors(data)
+
+
+@benchmark
+def validate_reaction() -> Callable:
+    data = {"user_id": 1, "reaction": ":thumbs_up:"}
+    return lambda: Reactions.reaction_validation_errors(1, data)
+
+
+@benchmark
+def normalize_emoji() -> Callable:
+    return lambda: normalize_reaction(":red_heart:")
+
+
+@benchmark
+def normalize_emoji_library() -> Callable:
+    # The emoji package calls the lookup tables of app.emojis replaced,
+    # for comparing with normalize_emoji
+    return lambda: emoji.is_emoji(emoji.emojize(":red_heart:"))
+
+
+@benchmark
+def leaderboard_page() -> Callable:
+    leaderboard_cache.rebuild()
+    return lambda: Users.get_leaderboard("list", "desc", 100)
+
+
+@benchmark
+def leaderboard_full() -> Callable:
+    return lambda: Users.get_leaderboard("list", "desc")
+
+
+@benchmark
+def leaderboard_graph_cached() -> Callable:
+    Users.get_leaderboard("graph", "desc")
+    return lambda: Users.get_leaderboard("graph", "desc")
+
+
+@benchmark
+def user_posts_top_author() -> Callable:
+    author_id = (
+        db.session.query(Posts.author_id)
+        .group_by(Posts.author_id)
+        .order_by(db.func.count(Posts.id).desc())
+        .limit(1)
+        .scalar()
+    )
+    return lambda: post_rows(posts_query(author_id).all())
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Returns the best and the median time of one call in seconds"""
+
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [time / number for time in timer.repeat(repeat, number)]
+    return {"best": min(times), "median": statistics.median(times)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The leaderboard isn't reloaded in the middle of the measurements
+        app = create_benchmark_app(
+            os.path.join(directory, "micro.db"), {"LEADERBOARD_TTL": 0}
+        )
+        with app.test_request_context():
+            dataset = generate(args.users)
+            print(
+                f"{dataset.users} users, {dataset.posts} posts, "
+                f"{dataset.reactions} reactions"
+            )
+
+            results = {}
+            for name in args.only or BENCHMARKS:
+                results[name] = measure(BENCHMARKS[name](), args.repeat)
+                print(
+                    f"{name:28s} best {results[name]['best'] * 1e6:12.1f}us  "
+                    f"median {results[name]['median'] * 1e6:12.1f}us"
+                )
+                # The measured functions only read, but the identity map
+                # shouldn't carry the loaded objects over to the next benchmark
+                db.session.remove()
+
+    if args.save:
+        save(args.save, results)
+    if args.compare and not compare(
+        args.compare, results, args.threshold, relative=("best",)
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Saving the benchmark results and comparing them with the saved ones,
+so a change making a hot path slower (or doing more queries) fails before the deploy"""
+
+import json
+from typing import Dict, List, Tuple
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)]
+
+
+def save(path: str, results: Dict[str, Dict[str, float]]) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def compare(
+    path: str,
+    results: Dict[str, Dict[str, float]],
+    threshold: float,
+    relative: Tuple[str, ...] = (),
+    exact: Tuple[str, ...] = (),
+) -> bool:
+    """Prints the results which got worse than the saved ones: the relative metrics
+    (like the times) if they grew more than threshold times, the exact ones
+    (like the numbers of the queries) if they grew at all.
+    Returns whether there are no such results"""
+
+    with open(path) as file:
+        baseline = json.load(file)
+
+    ok = True
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if previous is None or metric not in relative + exact:
+                continue
+            limit = previous if metric in exact else previous * threshold
+            if value > limit:
+                ok = False
+                print(f"REGRESSION {name} {metric}: {previous:.6g} -> {value:.6g}")
+    return ok
@@ -0,0 +1,174 @@
+"""Benchmark of GET /posts/search (the FTS5 index) against scanning
+the texts of the posts with LIKE '%...%' on a generated database:
+
+    python benchmarks/search.py --posts 1000000 --save baseline.json
+    python benchmarks/search.py --posts 1000000 --compare baseline.json
+
+The words of the posts follow Zipf's law like in a natural language,
+so there are both the words found in most of the posts and the rare ones.
+With --compare the exit code is 1 if the best time of any of the benchmarks
+became more than --threshold times slower.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List
+
+from data import create_benchmark_app
+from micro import measure
+from report import compare, save
+
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.models import Users, Posts
+from app.search import match_expression, posts_fts, search_posts, search_terms
+
+SYLLABLES = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+PAGE_SIZE = 20
+
+
+def vocabulary(rng: random.Random, size: int) -> List[str]:
+    """Returns the distinct pronounceable words, the most frequent one first"""
+
+    words: Dict[str, None] = {}
+    while len(words) < size:
+        words["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))] = None
+    return list(words)
+
+
+def generate_posts(
+    users: int, posts: int, words: List[str], seed: int = 0
+) -> Iterator[List[Dict]]:
+    """Yields the batches of the posts of 5 to 20 words, the frequency of the n-th word
+    of the vocabulary is proportional to 1/n"""
+
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1 / n for n in range(1, len(words) + 1)))
+    for start in range(0, posts, 50000):
+        yield [
+            {
+                "author_id": rng.randint(1, users),
+                "text": " ".join(
+                    rng.choices(words, cum_weights=cum_weights, k=rng.randint(5, 20))
+                ),
+            }
+            for _ in range(min(50000, posts - start))
+        ]
+
+
+def fts_page(query: str) -> Callable:
+    return lambda: search_posts(query, PAGE_SIZE)
+
+
+def fts_count(query: str) -> Callable:
+    statement = select(func.count()).where(
+        posts_fts.c.posts_fts.match(match_expression(search_terms(query)))
+    )
+    return lambda: db.session.scalar(statement)
+
+
+def like_page(word: str) -> Callable:
+    # Without a relevance the posts are returned in the order of their ids
+    statement = (
+        select(Posts.id, Posts.author_id, Posts.text)
+        .where(Posts.text.like(f"%{word}%"))
+        .order_by(Posts.id)
+        .limit(PAGE_SIZE + 1)
+    )
+    return lambda: db.session.execute(statement).all()
+
+
+def like_count(word: str) -> Callable:
+    statement = select(func.count()).where(Posts.text.like(f"%{word}%"))
+    return lambda: db.session.scalar(statement)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--words", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    words = vocabulary(random.Random(0), args.words)
+    # The most frequent word, a word from the middle and a rare word,
+    # the prefix of a frequent word and two frequent words together
+    queries = {
+        "common": words[0],
+        "medium": words[len(words) // 100],
+        "rare": words[-1],
+        "prefix": words[1][:3] + "*",
+        "two_words": f"{words[2]} {words[3]}",
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Scanning a million posts is expected to be slow
+        app = create_benchmark_app(
+            os.path.join(directory, "search.db"), {"SLOW_QUERY_MS": None}
+        )
+        with app.app_context():
+            start = time.perf_counter()
+            db.session.execute(
+                insert(Users),
+                [
+                    {
+                        "first_name": f"First{id}",
+                        "last_name": f"Last{id}",
+                        "email": f"user{id}@example.com",
+                    }
+                    for id in range(1, args.users + 1)
+                ],
+            )
+            # The triggers index the posts while they are inserted
+            for batch in generate_posts(args.users, args.posts, words):
+                db.session.execute(insert(Posts), batch)
+            db.session.commit()
+            print(
+                f"{args.users} users, {args.posts} posts, "
+                f"{args.words} words: {time.perf_counter() - start:.1f}s"
+            )
+
+            benchmarks: Dict[str, Callable] = {}
+            for name, query in queries.items():
+                benchmarks[f"fts_page_{name}"] = fts_page(query)
+                benchmarks[f"fts_count_{name}"] = fts_count(query)
+                # LIKE has no prefix queries, and with a single pattern
+                # the words have to be next to each other
+                if name != "two_words":
+                    word = query.rstrip("*")
+                    benchmarks[f"like_page_{name}"] = like_page(word)
+                    benchmarks[f"like_count_{name}"] = like_count(word)
+
+            for name, query in queries.items():
+                print(
+                    f"{name:10s} {query!r}: {benchmarks[f'fts_count_{name}']()} posts"
+                )
+
+            results = {}
+            for name, function in benchmarks.items():
+                results[name] = measure(function, args.repeat)
+                print(
+                    f"{name:24s} best {results[name]['best'] * 1e3:10.2f}ms  "
+                    f"median {results[name]['median'] * 1e3:10.2f}ms"
+                )
+
+    if args.save:
+        save(args.save, results)
+    if args.compare and not compare(
+        args.compare, results, args.threshold, relative=("best",)
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
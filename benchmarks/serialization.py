@@ -0,0 +1,64 @@
+"""Measures the serialization of the leaderboard json with both json backends,
+starting either from the ORM instances or from the rows they are converted to.
+
+The users are built in memory (the database isn't involved), each with the summary
+of a few posts:
+
+    python benchmarks/serialization.py 10000 100000
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from app.models import Users
+from app.serialization import orjson, serializer
+
+POSTS_PER_USER = 3
+
+
+def make_users(count: int) -> list:
+    users = []
+    for id in range(1, count + 1):
+        user = Users(f"First{id}", f"Last{id}", f"user{id}@example.com")
+        user.id = id
+        user.total_reactions = id % 1000
+        # The summary of the posts the json of a user contains, the newest first
+        user.post_count = POSTS_PER_USER
+        user.latest_posts = [
+            {"id": id * POSTS_PER_USER - number, "text": f"Post {id}-{number}"}
+            for number in range(POSTS_PER_USER)
+        ]
+        users.append(user)
+    return users
+
+
+def measure(users: list, backend: str, repeat: int = 3) -> float:
+    """Returns the best time of serializing the users in seconds"""
+
+    serializer.configure(backend)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serializer.dumps({"users": users})
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    backends = ["json"] + (["orjson"] if orjson is not None else [])
+    for count in map(int, sys.argv[1:] or ["10000", "100000"]):
+        users = make_users(count)
+        rows = [user.to_row() for user in users]
+        for source, items in (("instances", users), ("rows", rows)):
+            results = ", ".join(
+                f"{backend} {measure(items, backend) * 1000:.0f}ms"
+                for backend in backends
+            )
+            print(f"{count} users from {source}: {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measures how long a new process takes to create the app and how much memory it uses,
+then the same for the first leaderboard graph, which imports matplotlib:
+
+    python benchmarks/startup.py --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Runs in a new process and prints the seconds and the peak RSS in MiB
+# after creating the app and after rendering the first graph
+MEASURE = """
+import resource, sys, time
+
+start = time.perf_counter()
+from app import create_app
+
+app = create_app()
+created = time.perf_counter()
+print(created - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+print("matplotlib" in sys.modules)
+
+with app.test_client() as client:
+    client.post("/users/create", json={"first_name": "A", "last_name": "B", "email": "a@b.c"})
+    graph = time.perf_counter()
+    client.post("/users/leaderboard", json={"sort_type": "desc", "data_type": "graph"})
+print(time.perf_counter() - graph, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+
+def measure() -> tuple:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{directory}/startup.db",
+        )
+        subprocess.run(
+            [sys.executable, "-m", "flask", "--app", "app", "upgrade-db"],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            capture_output=True,
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split("\n")
+
+    startup_time, startup_rss = map(float, output[0].split())
+    graph_time, graph_rss = map(float, output[2].split())
+    return startup_time, startup_rss, output[1] == "True", graph_time, graph_rss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(args.repeat)]
+    startup_time, startup_rss, matplotlib_loaded, graph_time, graph_rss = zip(*results)
+
+    print(
+        f"create_app: {statistics.median(startup_time) * 1000:.0f}ms, "
+        f"{statistics.median(startup_rss):.0f}MiB RSS "
+        f"(matplotlib {'loaded' if any(matplotlib_loaded) else 'not loaded'})"
+    )
+    print(
+        f"first graph: {statistics.median(graph_time) * 1000:.0f}ms, "
+        f"{statistics.median(graph_rss):.0f}MiB RSS"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-from app import app, db
+from app import create_app
+from app.migrations import upgrade_database
+from app.models import leaderboard_cache
 
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade_database()
+        leaderboard_cache.rebuild()
     app.run(debug=True)
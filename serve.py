@@ -0,0 +1,84 @@
+"""Production server of the API.
+
+Runs gunicorn with SERVER_WORKERS processes of SERVER_THREADS threads each
+(waitress with the threads of a single process where gunicorn isn't available,
+like on Windows). The options can be set in the config or on the command line:
+
+    python serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+"""
+
+import argparse
+import importlib.util
+import os
+
+from flask import Flask
+
+from app import create_app, db
+from app.migrations import upgrade_database
+from app.models import leaderboard_cache
+
+
+def prepare(app: Flask) -> None:
+    """Brings the database up to date and loads the leaderboard (which the workers
+    inherit with the preloading). It's done once in the main process before
+    the workers are started, so they don't race each other creating the tables"""
+
+    with app.app_context():
+        upgrade_database()
+        leaderboard_cache.rebuild()
+
+        # The forked workers can't share the connections of the main process
+        db.engine.dispose()
+
+
+def serve_gunicorn(app: Flask, bind: str, workers: int, threads: int) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    preload = app.config["SERVER_PRELOAD"]
+
+    class Server(BaseApplication):
+        def load_config(self) -> None:
+            self.cfg.set("bind", bind)
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("preload_app", preload)
+
+        def load(self) -> Flask:
+            # Without the preloading every worker creates its own app after the fork.
+            # With it the workers get the app (and the loaded leaderboard) of the main process
+            return app if preload else create_app()
+
+    Server().run()
+
+
+def serve_waitress(app: Flask, bind: str, threads: int) -> None:
+    from waitress import serve
+
+    serve(app, listen=bind, threads=threads)
+
+
+def main() -> None:
+    app = create_app()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bind", default=app.config["SERVER_BIND"])
+    parser.add_argument("--workers", type=int, default=app.config["SERVER_WORKERS"])
+    parser.add_argument("--threads", type=int, default=app.config["SERVER_THREADS"])
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=app.config["SERVER_PRELOAD"],
+    )
+    args = parser.parse_args()
+    app.config["SERVER_PRELOAD"] = args.preload
+
+    prepare(app)
+
+    if importlib.util.find_spec("gunicorn") is not None:
+        serve_gunicorn(app, args.bind, args.workers or os.cpu_count(), args.threads)
+    else:
+        serve_waitress(app, args.bind, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+from typing import Callable, Dict, List
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from app import counters, create_app, db
+from app.migrations import upgrade_database
+from app.models import leaderboard_cache
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch) -> Callable[..., Flask]:
+    """Returns a function creating the app with the config overrides
+    and a new file-backed SQLite database"""
+
+    apps: List[Flask] = []
+    # The write-behind buffer of the test is bound to its app and database
+    counter_buffer = counters.CounterBuffer()
+    monkeypatch.setattr(counters, "counter_buffer", counter_buffer)
+
+    def make_app(config: Dict | None = None) -> Flask:
+        app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+                **(config or {}),
+            }
+        )
+        with app.app_context():
+            upgrade_database()
+        # The leaderboard is shared by all the apps of the process
+        leaderboard_cache.invalidate()
+        apps.append(app)
+        return app
+
+    yield make_app
+
+    counter_buffer.stop()
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app) -> Flask:
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
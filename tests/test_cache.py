@@ -0,0 +1,24 @@
+from app.cache import entity_cache, user_key
+from app.models import Users
+from app.serialization import serializer
+
+
+def test_json_serialized_before_an_invalidation_isnt_cached(app, client):
+    client.post(
+        "/users/create",
+        json={"first_name": "First", "last_name": "Last", "email": "user@test.com"},
+    )
+    client.post("/posts/create", json={"author_id": 1, "text": "Post"})
+
+    def serialize() -> bytes:
+        stale = serializer.dumps(Users.query.get(1).to_row())
+        # A reaction of the user is committed (and the user invalidated)
+        # while the read is still serializing the user without it
+        client.post("/reactions/react/1", json={"user_id": 1, "reaction": "👍"})
+        return stale
+
+    with app.test_request_context("/users/1"):
+        response = entity_cache.json_response(user_key(1), serialize)
+    assert response.json["total_reactions"] == 0
+
+    assert client.get("/users/1").json["total_reactions"] == 1
@@ -0,0 +1,144 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+from app import counters, db
+from app.models import Users, Posts, Reactions, PostReactionCounts
+
+USERS = 10
+POSTS = 5
+THREADS = 8
+REQUESTS = 50
+
+
+def react(app, seed: int) -> None:
+    """Sends the reactions from one thread and deletes some of them"""
+
+    client = app.test_client()
+    rng = random.Random(seed)
+    for _ in range(REQUESTS):
+        response = client.post(
+            f"/reactions/react/{rng.randint(1, POSTS)}",
+            json={"user_id": rng.randint(1, USERS), "reaction": rng.choice("👍❤🔥")},
+        )
+        assert "reaction_id" in response.json, response.json
+        if rng.random() < 0.3:
+            response = client.post(f"/reactions/delete/{response.json['reaction_id']}")
+            assert response.status_code == 200
+
+
+def test_concurrent_reactions_keep_counters_consistent(app, client):
+    for id in range(USERS):
+        client.post(
+            "/users/create",
+            json={"first_name": "F", "last_name": "L", "email": f"user{id}@test.com"},
+        )
+    for _ in range(POSTS):
+        client.post("/posts/create", json={"author_id": 1, "text": "Post"})
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        for future in [executor.submit(react, app, seed) for seed in range(THREADS)]:
+            future.result()
+
+    with app.app_context():
+        # Every counter equals the number of the reactions it counts
+        reactions_by_user = dict(
+            db.session.query(Reactions.author_id, func.count()).group_by(
+                Reactions.author_id
+            )
+        )
+        reactions_by_post = dict(
+            db.session.query(Reactions.post_id, func.count()).group_by(
+                Reactions.post_id
+            )
+        )
+        reactions_by_pair = {
+            (post_id, reaction): count
+            for post_id, reaction, count in db.session.query(
+                Reactions.post_id, Reactions.reaction, func.count()
+            ).group_by(Reactions.post_id, Reactions.reaction)
+        }
+
+        assert sum(reactions_by_post.values()) > 0
+        assert {
+            id: total for id, total in db.session.query(Users.id, Users.total_reactions)
+        } == {id: reactions_by_user.get(id, 0) for id in range(1, USERS + 1)}
+        assert {
+            id: total for id, total in db.session.query(Posts.id, Posts.total_reactions)
+        } == {id: reactions_by_post.get(id, 0) for id in range(1, POSTS + 1)}
+        assert {
+            (post_id, reaction): count
+            for post_id, reaction, count in db.session.query(
+                PostReactionCounts.post_id,
+                PostReactionCounts.reaction,
+                PostReactionCounts.count,
+            )
+        } == reactions_by_pair
+
+
+def test_write_behind_deletes_net_out_buffered_reactions(make_app):
+    # The flushes only happen when the test asks for them
+    app = make_app({"COUNTERS_WRITE_BEHIND": True, "COUNTERS_FLUSH_INTERVAL": 60})
+    client = app.test_client()
+    for id in range(3):
+        client.post(
+            "/users/create",
+            json={"first_name": "F", "last_name": "L", "email": f"user{id}@test.com"},
+        )
+    client.post("/posts/create", json={"author_id": 1, "text": "Kept"})
+    client.post("/posts/create", json={"author_id": 1, "text": "Deleted"})
+
+    # The reactions of the deleted user and to the deleted post are still buffered
+    # when they are deleted
+    client.post("/reactions/react/1", json={"user_id": 2, "reaction": "👍"})
+    client.post("/reactions/react/1", json={"user_id": 3, "reaction": "👍"})
+    client.post("/reactions/react/2", json={"user_id": 3, "reaction": "🔥"})
+    client.post("/users/delete/2")
+    client.post("/posts/delete/2")
+    counters.counter_buffer.flush()
+
+    with app.app_context():
+        assert db.session.query(
+            PostReactionCounts.post_id,
+            PostReactionCounts.reaction,
+            PostReactionCounts.count,
+        ).all() == [(1, "👍", 1)]
+        assert dict(db.session.query(Users.id, Users.total_reactions)) == {1: 0, 3: 1}
+        assert db.session.query(Posts.total_reactions).all() == [(1,)]
+    assert client.get("/posts/1?reactions=summary").json["reactions"] == {"👍": 1}
+
+
+def test_write_behind_deltas_of_deleted_rows_skip_reused_ids(make_app):
+    app = make_app({"COUNTERS_WRITE_BEHIND": True, "COUNTERS_FLUSH_INTERVAL": 60})
+    client = app.test_client()
+    for id in range(2):
+        client.post(
+            "/users/create",
+            json={"first_name": "F", "last_name": "L", "email": f"user{id}@test.com"},
+        )
+    client.post("/posts/create", json={"author_id": 1, "text": "Kept"})
+    client.post("/posts/create", json={"author_id": 1, "text": "Deleted"})
+
+    # SQLite gives the biggest deleted id to the next new row,
+    # the buffered reactions of the deleted rows mustn't be written to the new ones
+    client.post("/reactions/react/2", json={"user_id": 1, "reaction": "👍"})
+    client.post("/reactions/react/1", json={"user_id": 2, "reaction": "🔥"})
+    client.post("/posts/delete/2")
+    client.post("/users/delete/2")
+    assert (
+        client.post("/posts/create", json={"author_id": 1, "text": "New"}).json["id"]
+        == 2
+    )
+    new_user = client.post(
+        "/users/create",
+        json={"first_name": "F", "last_name": "L", "email": "new@test.com"},
+    ).json
+    assert new_user["id"] == 2
+    counters.counter_buffer.flush()
+
+    with app.app_context():
+        assert db.session.query(PostReactionCounts).count() == 0
+        assert dict(db.session.query(Users.id, Users.total_reactions)) == {1: 0, 2: 0}
+        assert dict(db.session.query(Posts.id, Posts.total_reactions)) == {1: 0, 2: 0}
+    assert client.get("/posts/2?reactions=summary").json["reactions"] == {}
@@ -0,0 +1,55 @@
+import re
+
+from app.metrics import PROMETHEUS_CONTENT_TYPE, metrics
+
+SAMPLE = re.compile(r"^(\w+)(?:\{(.*)\})? (\S+)$")
+
+
+def samples(text: str):
+    """Returns the (name, labels, value) of the samples of the exposition"""
+
+    result = []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        result.append((name, labels or "", float(value)))
+    return result
+
+
+def test_metrics_are_exposed_in_the_prometheus_format(client):
+    metrics.reset()
+    client.post(
+        "/users/create",
+        json={"first_name": "First", "last_name": "Last", "email": "new@test.com"},
+    )
+    for _ in range(3):
+        client.get("/users/1")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type == PROMETHEUS_CONTENT_TYPE
+
+    route = 'route="GET /users/<int:user_id>"'
+    exposed = samples(response.get_data(as_text=True))
+    buckets = [
+        value
+        for name, labels, value in exposed
+        if name == "api_request_duration_seconds_bucket" and labels.startswith(route)
+    ]
+    # The buckets are cumulative and the +Inf one counts every request
+    assert buckets == sorted(buckets)
+    assert buckets[-1] == 3
+    assert ("api_request_duration_seconds_count", route, 3) in exposed
+    assert ("api_requests_total", f'{route},status="200"', 3) in exposed
+    assert any(name == "api_request_duration_seconds_sum" for name, _, _ in exposed)
+
+
+def test_metrics_are_still_available_as_json(client):
+    metrics.reset()
+    client.get("/users/1")
+
+    response = client.get("/metrics?format=json")
+    assert response.mimetype == "application/json"
+    assert response.json["routes"]["GET /users/<int:user_id>"]["requests"] == 1
+    assert "invalid_format" in client.get("/metrics?format=xml").json["errors"]
@@ -0,0 +1,38 @@
+import pytest
+
+USERS = 4
+
+
+@pytest.fixture
+def users_client(client):
+    """Client with USERS users (without reactions) and the posts of the first one"""
+
+    for id in range(USERS):
+        client.post(
+            "/users/create",
+            json={"first_name": "F", "last_name": "L", "email": f"user{id}@test.com"},
+        )
+        client.post("/posts/create", json={"author_id": 1, "text": f"Post {id}"})
+    return client
+
+
+@pytest.mark.parametrize("limit", [None, 10])
+def test_leaderboard_starts_after_the_cursor(users_client, limit):
+    request = {"sort_type": "asc", "data_type": "list", "cursor": "0:2"}
+    if limit is not None:
+        request["limit"] = limit
+
+    response = users_client.post("/users/leaderboard", json=request).json
+
+    assert [user["id"] for user in response["users"]] == [3, 4]
+
+
+@pytest.mark.parametrize("limit", [None, 10])
+def test_user_posts_start_after_the_cursor(users_client, limit):
+    request = {"sort_type": "asc", "cursor": "0:2"}
+    if limit is not None:
+        request["limit"] = limit
+
+    response = users_client.post("/users/1/posts", json=request).json
+
+    assert [post["id"] for post in response["posts"]] == [3, 4]
@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Users, Posts
+
+USERS = 3
+THREADS = 8
+REQUESTS = 20
+
+
+def expected_summaries(latest_count: int) -> dict:
+    """Returns the (post_count, latest_posts) of every user computed from the posts"""
+
+    posts = db.session.execute(
+        select(Posts.author_id, Posts.id, Posts.text).order_by(Posts.id.desc())
+    ).all()
+    return {
+        id: (
+            sum(author_id == id for author_id, _, _ in posts),
+            [
+                {"id": post_id, "text": text}
+                for author_id, post_id, text in posts
+                if author_id == id
+            ][:latest_count],
+        )
+        for id in db.session.scalars(select(Users.id))
+    }
+
+
+def create_posts(app, thread: int) -> None:
+    client = app.test_client()
+    for number in range(REQUESTS):
+        response = client.post(
+            "/posts/create",
+            json={"author_id": number % USERS + 1, "text": f"Post {thread}-{number}"},
+        )
+        assert "id" in response.json, response.json
+
+
+def test_summaries_follow_the_created_and_deleted_posts(app, client):
+    for id in range(USERS):
+        client.post(
+            "/users/create",
+            json={"first_name": "F", "last_name": "L", "email": f"user{id}@test.com"},
+        )
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(create_posts, [app] * THREADS, range(THREADS)))
+    response = client.post(
+        "/posts/bulk",
+        json=[{"author_id": id % USERS + 1, "text": f"Bulk {id}"} for id in range(5)],
+    )
+    assert all("id" in result for result in response.json["results"])
+    # Deleting the latest post of the first user and all the posts of the second one
+    latest_post_id = client.get("/users/1").json["latest_posts"][0]["id"]
+    client.post(f"/posts/delete/{latest_post_id}")
+    with app.app_context():
+        for id in db.session.scalars(select(Posts.id).where(Posts.author_id == 2)):
+            client.post(f"/posts/delete/{id}")
+
+    with app.app_context():
+        expected = expected_summaries(app.config["USER_LATEST_POSTS"])
+        summaries = {
+            id: (post_count, latest_posts)
+            for id, post_count, latest_posts in db.session.execute(
+                select(Users.id, Users.post_count, Users.latest_posts)
+            )
+        }
+    assert summaries == expected
+    assert expected[2] == (0, [])
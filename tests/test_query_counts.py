@@ -0,0 +1,80 @@
+from collections import Counter
+from typing import Dict
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+
+USER = {"first_name": "First", "last_name": "Last", "email": "new@test.com"}
+
+# The statements each endpoint sends to the database by their kind,
+# adding a query to any of them has to change this table
+EXPECTED_STATEMENTS = {
+    # EXISTS for the email, the INSERT and reloading the user for the response
+    "user_create": ("/users/create", USER, {"SELECT": 2, "INSERT": 1}),
+    # EXISTS for the author, the INSERT, the latest posts of the author (locked),
+    # the UPDATE of the summary adding one to post_count
+    # and reloading the post with its reactions for the response
+    "post_create": (
+        "/posts/create",
+        {"author_id": 1, "text": "New post"},
+        {"SELECT": 4, "INSERT": 1, "UPDATE": 1},
+    ),
+    # One EXISTS query for the post and the user, the INSERT,
+    # the counters of the user and the post and the upsert of the post_reaction_counts
+    "react_to_post": (
+        "/reactions/react/1",
+        {"user_id": 1, "reaction": "👍"},
+        {"SELECT": 1, "INSERT": 2, "UPDATE": 2},
+    ),
+}
+
+
+def count_statements(app, request) -> Dict[str, int]:
+    """Sends the request and returns the number of the statements of each kind
+    (SELECT, INSERT, ...) it executed"""
+
+    statements: Counter = Counter()
+
+    def count(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements[statement.split(None, 1)[0].upper()] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = request()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    assert "errors" not in response.json, response.json
+    return dict(statements)
+
+
+@pytest.fixture
+def existing_post(client) -> None:
+    client.post("/users/create", json={**USER, "email": "author@test.com"})
+    client.post("/posts/create", json={"author_id": 1, "text": "Post"})
+
+
+@pytest.mark.parametrize("name", EXPECTED_STATEMENTS)
+def test_endpoint_statements(app, client, existing_post, name):
+    path, json, expected = EXPECTED_STATEMENTS[name]
+    assert count_statements(app, lambda: client.post(path, json=json)) == expected
+
+
+def test_react_to_post_statements_write_behind(make_app):
+    # The counters are only changed by the background thread
+    app = make_app({"COUNTERS_WRITE_BEHIND": True, "COUNTERS_FLUSH_INTERVAL": 60})
+    client = app.test_client()
+    client.post("/users/create", json=USER)
+    client.post("/posts/create", json={"author_id": 1, "text": "Post"})
+
+    assert count_statements(
+        app,
+        lambda: client.post(
+            "/reactions/react/1", json={"user_id": 1, "reaction": "👍"}
+        ),
+    ) == {"SELECT": 1, "INSERT": 1}
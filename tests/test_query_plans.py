@@ -0,0 +1,89 @@
+from typing import Callable, List
+
+import pytest
+from sqlalchemy import event, select
+
+from app import db
+from app.counters import reaction_counts
+from app.models import Users, Posts, Reactions, order_by_reactions
+from app.read_models import posts_query
+
+
+def query_plans(function: Callable[[], object]) -> List[str]:
+    """Runs the function and returns the EXPLAIN QUERY PLAN details
+    of every statement it executed with the same parameters"""
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        function()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    connection = db.session.connection()
+    return [
+        row[-1]
+        for statement, parameters in statements
+        for row in connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+    ]
+
+
+# The queries which run on every request changing the reactions or listing the posts
+HOT_QUERIES = {
+    "reactions_by_post": lambda: reaction_counts(
+        Reactions.author_id, Reactions.post_id == 1
+    ),
+    "reactions_by_author": lambda: reaction_counts(
+        (Reactions.post_id, Reactions.reaction), Reactions.author_id == 1
+    ),
+    "reactions_by_author_posts": lambda: reaction_counts(
+        Reactions.author_id,
+        Reactions.post_id.in_(select(Posts.id).where(Posts.author_id == 1)),
+    ),
+    "posts_by_author": lambda: order_by_reactions(posts_query(1), Posts, "desc")
+    .limit(10)
+    .all(),
+    "posts_by_author_page": lambda: order_by_reactions(
+        posts_query(1), Posts, "asc", "3:4"
+    )
+    .limit(10)
+    .all(),
+    "leaderboard_page": lambda: order_by_reactions(
+        db.session.query(Users.id), Users, "desc", "3:4"
+    )
+    .limit(10)
+    .all(),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_search_indexes(app, name):
+    with app.app_context():
+        plans = query_plans(HOT_QUERIES[name])
+
+    assert plans
+    for detail in plans:
+        assert not detail.startswith("SCAN"), (name, plans)
+    assert any(
+        detail.startswith("SEARCH") and "USING" in detail and "INDEX" in detail
+        for detail in plans
+    ), (name, plans)
+
+
+def test_leaderboard_first_page_reads_index_in_order(app):
+    # Without a cursor there's nothing to search for, but the index
+    # has to give the order, so the users aren't sorted
+    with app.app_context():
+        plans = query_plans(
+            lambda: order_by_reactions(db.session.query(Users.id), Users, "desc")
+            .limit(10)
+            .all()
+        )
+
+    assert plans == ["SCAN users USING COVERING INDEX ix_users_total_reactions_id"]
@@ -0,0 +1,57 @@
+import pytest
+
+MAX_RANKED = 3
+POSTS = 10
+
+
+@pytest.fixture
+def search_client(make_app):
+    """Client of an app ranking at most MAX_RANKED posts, with POSTS matching posts
+    and one which doesn't match"""
+
+    client = make_app({"SEARCH_MAX_RANKED": MAX_RANKED}).test_client()
+    client.post(
+        "/users/create",
+        json={"first_name": "First", "last_name": "Last", "email": "user@test.com"},
+    )
+    for number in range(POSTS):
+        client.post(
+            "/posts/create",
+            json={"author_id": 1, "text": "word " * (number % 3 + 1) + str(number)},
+        )
+    client.post("/posts/create", json={"author_id": 1, "text": "other"})
+    return client
+
+
+def search_all(client, path: str) -> list:
+    """Returns the ids of the posts on all the pages starting with the path"""
+
+    ids = []
+    while path is not None:
+        response = client.get(path).json
+        ids += [post["id"] for post in response["posts"]]
+        path = (
+            f"/posts/search?q=word&limit=2&cursor={response['next_cursor']}"
+            if response["next_cursor"]
+            else None
+        )
+    return ids
+
+
+def test_older_matches_are_reached_after_the_ranked_ones(search_client):
+    ids = search_all(search_client, "/posts/search?q=word&limit=2")
+
+    assert sorted(ids) == list(range(1, POSTS + 1))
+    # Every SEARCH_MAX_RANKED matching posts are ranked among themselves,
+    # the newest of them first
+    assert set(ids[:MAX_RANKED]) == {8, 9, 10}
+    assert set(ids[MAX_RANKED : 2 * MAX_RANKED]) == {5, 6, 7}
+
+
+def test_cursor_range_is_limited_to_the_ranked_posts(search_client):
+    response = search_client.get(
+        "/posts/search?q=word&limit=100&cursor=0:0:999999999"
+    ).json
+
+    assert {post["id"] for post in response["posts"]} == {8, 9, 10}
+    assert response["next_cursor"] is not None